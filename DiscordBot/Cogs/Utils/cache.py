@@ -0,0 +1,73 @@
+import collections
+import time
+
+_DEFAULT = object()
+
+
+class LRUCache:
+    """A size-bounded mapping with optional per-entry expiry.
+
+    Least recently used entries are evicted once ``maxsize`` is reached.
+    Entries expire ``ttl`` seconds after being stored, unless ``ttl`` is
+    None. Lookups are counted in ``hits`` and ``misses``.
+    """
+
+    def __init__(self, maxsize=128, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            expires, value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value, ttl=_DEFAULT):
+        """Stores a value. ``ttl`` overrides the cache's default expiry."""
+        ttl = self.ttl if ttl is _DEFAULT else ttl
+        expires = None if ttl is None else time.monotonic() + ttl
+
+        self._data[key] = (expires, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def items(self):
+        """Returns (key, value, seconds left) for every live entry, oldest first.
+
+        Seconds left is None for entries that never expire.
+        """
+        now = time.monotonic()
+        return [(key, value, None if expires is None else expires - now)
+                for key, (expires, value) in self._data.items()
+                if expires is None or expires > now]
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
@@ -1,6 +1,13 @@
 import asyncio
+import concurrent.futures
 import json
 import os
+import sqlite3
+import uuid
+import weakref
+
+# Every open write-behind database, so they can all be flushed on shutdown
+_write_behind = weakref.WeakSet()
 
 
 def load_json_file(file_name):
@@ -11,19 +18,34 @@ def load_json_file(file_name):
     return inp_file
 
 class Database:
-    """The database object. Internally based on ''json''."""
+    """The database object. Internally based on ''json''.
+
+    By default every mutation rewrites the file. Passing ``write_behind=True``
+    makes mutations only mark the database as dirty; the pending changes are
+    then coalesced into a single atomic write after ``flush_interval`` seconds.
+    Once ``flush_threshold`` mutations are pending the mutating call writes the
+    file itself, so at most that many mutations (or ``flush_interval`` seconds
+    worth of them) can be lost on a crash. Call ``flush`` before shutting down.
+    """
 
     def __init__(self, name, **options):
         self.name = name
         self.object_hook = options.pop('object_hook', None)
         self.encoder = options.pop('encoder', None)
         self.loop = options.pop('loop', asyncio.get_event_loop())
+        self.write_behind = options.pop('write_behind', False)
+        self.flush_interval = options.pop('flush_interval', 5.0)
+        self.flush_threshold = options.pop('flush_threshold', 100)
+        self._pending = 0
+        self._flush_handle = None
         if options.pop('load_later', False):
             self.loop.create_task(self.load())
         else:
             self.load_from_file()
 
         self.lock = asyncio.Lock()
+        if self.write_behind:
+            _write_behind.add(self)
 
     def load_from_file(self):
         try:
@@ -36,26 +58,152 @@ class Database:
         await self.loop.run_in_executor(None, self.load_from_file)
 
     def _dump(self):
-        with open(self.name, 'w') as f:
+        # Write to a temporary file first so a crash mid-write never
+        # leaves a truncated database behind.
+        temp = '{}-{}.tmp'.format(self.name, uuid.uuid4())
+        with open(temp, 'w') as f:
             json.dump(self._db, f, ensure_ascii=True, cls=self.encoder, indent=4)
+        os.replace(temp, self.name)
 
     async def save(self):
         await self.loop.run_in_executor(None, self._dump)
 
+    @property
+    def dirty(self):
+        """Whether there are mutations that have not been written yet."""
+        return self._pending > 0
+
+    async def _commit(self, op):
+        # Must be called with the lock held, after the op was applied to _db.
+        self._pending += 1
+        if not self.write_behind or self._pending >= self.flush_threshold:
+            await self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = self.loop.call_later(self.flush_interval, self._start_flush)
+
+    def _start_flush(self):
+        self._flush_handle = None
+        self.loop.create_task(self.flush())
+
+    async def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        if self._pending:
+            await self.save()
+            self._pending = 0
+
+    async def flush(self):
+        """Writes any pending mutations to disk."""
+        with await self.lock:
+            await self._flush()
+
     def get(self, key, *args):
         return self._db.get(key, *args)
 
+    @staticmethod
+    def _path(subkey):
+        return tuple(subkey) if isinstance(subkey, (tuple, list)) else (subkey,)
+
+    def _parent(self, key, path, create=True):
+        # Walks (key,) + path and returns the container holding the last
+        # element along with the index of that element in it.
+        parent, last = self._db, key
+        for part in path:
+            if create and isinstance(parent, dict):
+                parent = parent.setdefault(last, {})
+            else:
+                parent = parent[last]
+            last = part
+        return parent, last
+
+    def _apply(self, op):
+        action, key, *args = op
+        if action == 'put':
+            self._db[key] = args[0]
+        elif action == 'remove':
+            self._db.pop(key, None)
+        elif action == 'set_in':
+            parent, last = self._parent(key, args[0])
+            parent[last] = args[1]
+        elif action == 'pop_in':
+            try:
+                parent, last = self._parent(key, args[0], create=False)
+                parent.pop(last)
+            except (KeyError, IndexError, TypeError):
+                pass
+
     async def put(self, key, value, *args):
         """Edits a config entry."""
         with await self.lock:
             self._db[key] = value
-            await self.save()
+            await self._commit(('put', key, value))
 
     async def remove(self, key):
         """Removes a config entry."""
         with await self.lock:
             del self._db[key]
-            await self.save()
+            await self._commit(('remove', key))
+
+    async def set_in(self, key, subkey, value):
+        """Sets a value nested inside an entry.
+
+        ``subkey`` is either a single key or a tuple path into the entry.
+        Missing dicts along the path are created. Only the changed path
+        is handed to the storage engine.
+        """
+        path = self._path(subkey)
+        with await self.lock:
+            parent, last = self._parent(key, path)
+            parent[last] = value
+            await self._commit(('set_in', key, path, value))
+
+    async def append_in(self, key, subkey, value, *, unique=False):
+        """Appends to a list nested inside an entry, creating it if needed.
+
+        With ``unique`` the value is only appended if the list does not
+        already contain it. Returns whether the value was appended.
+        """
+        path = self._path(subkey)
+        with await self.lock:
+            parent, last = self._parent(key, path)
+            if isinstance(parent, dict):
+                items = parent.setdefault(last, [])
+            else:
+                items = parent[last]
+            if unique and value in items:
+                return False
+            items.append(value)
+            await self._commit(('set_in', key, path, items))
+            return True
+
+    async def remove_in(self, key, subkey, value):
+        """Removes a value from a list nested inside an entry.
+
+        Raises ValueError if the value is not in the list.
+        """
+        path = self._path(subkey)
+        with await self.lock:
+            parent, last = self._parent(key, path, create=False)
+            items = parent[last]
+            items.remove(value)
+            await self._commit(('set_in', key, path, items))
+
+    async def pop_in(self, key, subkey, *default):
+        """Removes and returns a value nested inside an entry."""
+        path = self._path(subkey)
+        with await self.lock:
+            try:
+                parent, last = self._parent(key, path, create=False)
+                value = parent.pop(last)
+            except (KeyError, IndexError, TypeError):
+                if default:
+                    return default[0]
+                raise
+
+            await self._commit(('pop_in', key, path))
+            return value
 
     def __contains__(self, item):
         return self._db.__contains__(item)
@@ -64,4 +212,251 @@ class Database:
         return self._db.__len__()
 
     def all(self):
-        return self._db
\ No newline at end of file
+        return self._db
+
+
+class JournalDatabase(Database):
+    """A database that appends every mutation to a journal.
+
+    Each mutation is written as one compact JSON line to
+    ``<name>.journal`` instead of re-serialising everything, so a write
+    costs O(size of the change). Once the journal grows past
+    ``compact_threshold`` bytes it is folded into the regular JSON snapshot
+    at ``name`` and truncated. On load the snapshot is read and the journal
+    replayed on top of it. Journal entries always hold resulting values, so
+    replaying one twice is harmless.
+    """
+
+    def __init__(self, name, **options):
+        self.journal_name = options.pop('journal', name + '.journal')
+        self.compact_threshold = options.pop('compact_threshold', 1 << 20)
+        self._journal = []
+        self._journal_size = 0
+        super().__init__(name, **options)
+
+    def load_from_file(self):
+        super().load_from_file()
+        torn = False
+        try:
+            with open(self.journal_name, 'r') as f:
+                for line in f:
+                    try:
+                        op = json.loads(line, object_hook=self.object_hook)
+                    except ValueError:
+                        # a torn write at the tail of the journal
+                        torn = True
+                        break
+                    self._apply(op)
+                    # an unterminated last line would be glued to the next append
+                    torn = not line.endswith('\n')
+            self._journal_size = os.path.getsize(self.journal_name)
+        except FileNotFoundError:
+            self._journal_size = 0
+
+        if torn:
+            # Fold everything that replayed into the snapshot so new entries
+            # are never appended after the damaged tail.
+            self.compact()
+
+    def _dump(self):
+        lines, self._journal = self._journal, []
+        if lines:
+            with open(self.journal_name, 'a') as f:
+                f.write('\n'.join(lines) + '\n')
+                self._journal_size = f.tell()
+
+        if self._journal_size > self.compact_threshold:
+            self.compact()
+
+    def compact(self):
+        """Folds the journal into the snapshot."""
+        super()._dump()
+        open(self.journal_name, 'w').close()
+        self._journal_size = 0
+
+    async def _commit(self, op):
+        self._journal.append(json.dumps(op, ensure_ascii=True, cls=self.encoder, separators=(',', ':')))
+        await super()._commit(op)
+
+
+class SqliteDatabase(Database):
+    """A database backed by SQLite.
+
+    Every top-level key is a row in ``entries``. Values that are dicts are
+    split further into one ``fields`` row per sub-key, so storing a guild's
+    dict only rewrites the sub-keys that actually changed. The contents are
+    mirrored in memory so ``get`` stays synchronous, while all queries run on
+    a dedicated writer thread and never block the event loop.
+
+    The database lives at ``path`` (``name`` with a ``.sqlite3`` extension by
+    default). When it does not exist yet and the JSON file at ``name`` does,
+    the JSON data is migrated into it once.
+    """
+
+    def __init__(self, name, **options):
+        self.path = options.pop('path', os.path.splitext(name)[0] + '.sqlite3')
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._conn = None
+        self._rows = {}
+        super().__init__(name, **options)
+
+    def _connection(self):
+        # Only ever called from the writer thread.
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path)
+            with self._conn:
+                self._conn.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT)')
+                self._conn.execute('CREATE TABLE IF NOT EXISTS fields (key TEXT, field TEXT, value TEXT NOT NULL, '
+                                   'PRIMARY KEY (key, field))')
+        return self._conn
+
+    def _execute(self, statements):
+        conn = self._connection()
+        with conn:
+            for statement in statements:
+                conn.execute(*statement)
+
+    def _fetch(self):
+        conn = self._connection()
+        entries = conn.execute('SELECT key, value FROM entries').fetchall()
+        fields = conn.execute('SELECT key, field, value FROM fields').fetchall()
+        return entries, fields
+
+    def _encode(self, value):
+        return json.dumps(value, ensure_ascii=True, cls=self.encoder, separators=(',', ':'))
+
+    def _decode(self, text):
+        return json.loads(text, object_hook=self.object_hook)
+
+    def load_from_file(self):
+        migrate = not os.path.exists(self.path) and os.path.exists(self.name)
+        entries, fields = self._executor.submit(self._fetch).result()
+
+        self._db = {}
+        self._rows = {}
+        for key, text in entries:
+            self._db[key] = {} if text is None else self._decode(text)
+            self._rows[key] = (text, {})
+        for key, field, text in fields:
+            self._db[key][field] = self._decode(text)
+            self._rows[key][1][field] = text
+
+        if migrate:
+            self.migrate_from_json(self.name)
+
+    def migrate_from_json(self, file_name):
+        """Imports every entry of a JSON database file."""
+        with open(file_name, 'r') as f:
+            data = json.load(f, object_hook=self.object_hook)
+
+        statements = []
+        for key, value in data.items():
+            self._db[key] = value
+            statements.extend(self._plan(('put', key, value)))
+        self._executor.submit(self._execute, statements).result()
+
+    def _plan(self, op):
+        """Turns an op into the statements needed to persist it.
+
+        ``_rows`` holds the encoded rows as they are stored, so only
+        rows whose encoding changed are written.
+        """
+        action, key, *args = op
+        if action in ('set_in', 'pop_in'):
+            return self._plan_nested(action, key, args[0])
+
+        key = str(key)
+        old_text, old_fields = self._rows.pop(key, (False, {}))
+
+        if action == 'remove':
+            return [('DELETE FROM entries WHERE key = ?', (key,)),
+                    ('DELETE FROM fields WHERE key = ?', (key,))]
+
+        value = args[0]
+        if isinstance(value, dict):
+            text, fields = None, {str(k): self._encode(v) for k, v in value.items()}
+        else:
+            text, fields = self._encode(value), {}
+
+        statements = []
+        if text != old_text:
+            statements.append(('INSERT OR REPLACE INTO entries (key, value) VALUES (?, ?)', (key, text)))
+        for field, field_text in fields.items():
+            if old_fields.get(field) != field_text:
+                statements.append(('INSERT OR REPLACE INTO fields (key, field, value) VALUES (?, ?, ?)',
+                                   (key, field, field_text)))
+        for field in old_fields.keys() - fields.keys():
+            statements.append(('DELETE FROM fields WHERE key = ? AND field = ?', (key, field)))
+
+        self._rows[key] = (text, fields)
+        return statements
+
+    def _plan_nested(self, action, key, path):
+        if not path:
+            return self._plan(('put', key, self._db[key]) if key in self._db else ('remove', key))
+
+        value = self._db[key]
+        text, fields = self._rows.get(str(key), (False, {}))
+        if text is not None or not isinstance(value, dict):
+            # not stored as split fields, so there is no smaller row to touch
+            return self._plan(('put', key, value))
+
+        field = str(path[0])
+        if path[0] in value:
+            fields[field] = self._encode(value[path[0]])
+            return [('INSERT OR REPLACE INTO fields (key, field, value) VALUES (?, ?, ?)',
+                     (str(key), field, fields[field]))]
+
+        fields.pop(field, None)
+        return [('DELETE FROM fields WHERE key = ? AND field = ?', (str(key), field))]
+
+    async def _commit(self, op):
+        statements = self._plan(op)
+        if statements:
+            await self.loop.run_in_executor(self._executor, self._execute, statements)
+
+    async def save(self):
+        # Statements run in submission order on the writer thread, so this
+        # returns once everything queued before it has been written.
+        await self.loop.run_in_executor(self._executor, lambda: None)
+
+    async def flush(self):
+        """Waits until every queued write has been committed."""
+        await self.save()
+
+    def close(self):
+        """Closes the connection and stops the writer thread."""
+        def close_connection():
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+        self._executor.submit(close_connection)
+        self._executor.shutdown(wait=True)
+
+
+engines = {
+    'json': Database,
+    'journal': JournalDatabase,
+    'sqlite': SqliteDatabase,
+}
+
+default_engine = 'json'
+engine_overrides = {}
+
+
+async def flush_all():
+    """Writes the pending mutations of every write-behind database."""
+    for db in list(_write_behind):
+        await db.flush()
+
+
+def connect(name, **options):
+    """Opens a database with the storage engine configured for it.
+
+    The engine is looked up in ``engine_overrides`` by file name and
+    falls back to ``default_engine``, so the backing store of a database
+    can be switched from the config without touching the cogs.
+    """
+    engine = options.pop('engine', None) or engine_overrides.get(name, default_engine)
+    return engines[engine](name, **options)
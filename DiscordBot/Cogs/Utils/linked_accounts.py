@@ -0,0 +1,95 @@
+from .steamapi import ID
+
+
+class LinkedAccountIndex:
+    """Maps Dota account IDs to the Discord members that linked them.
+
+    The links come from ``bot.steam_info`` and the members from the servers
+    the bot is in. Both are kept up to date through ``link``/``unlink`` and
+    the member and server events, so resolving a player never has to walk
+    every member of every server.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._discord_ids = {}  # dota ID -> {discord ID}
+        self._dota_ids = {}  # discord ID -> {dota ID}
+        self._members = {}  # discord ID -> {server ID: member}
+
+        for discord_id, steam_ids in bot.steam_info.all().items():
+            for steam_id in steam_ids:
+                self._add_link(discord_id, steam_id)
+
+        for event in ('on_ready', 'on_member_join', 'on_member_remove', 'on_server_join', 'on_server_remove'):
+            bot.add_listener(getattr(self, event))
+
+    def _add_link(self, discord_id, steam_id):
+        dota_id = ID.steam_to_dota(steam_id)
+        self._discord_ids.setdefault(dota_id, set()).add(discord_id)
+        self._dota_ids.setdefault(discord_id, set()).add(dota_id)
+
+    def _add_member(self, member):
+        if member.id in self._dota_ids:
+            self._members.setdefault(member.id, {})[member.server.id] = member
+
+    def _remove_member(self, member):
+        servers = self._members.get(member.id)
+        if servers is not None:
+            servers.pop(member.server.id, None)
+            if not servers:
+                del self._members[member.id]
+
+    def link(self, discord_id, steam_id):
+        """Records a newly linked Steam account."""
+        self._add_link(discord_id, steam_id)
+        for server in self.bot.servers:
+            member = server.get_member(discord_id)
+            if member is not None:
+                self._add_member(member)
+
+    def unlink(self, discord_id, steam_id):
+        """Forgets a Steam account that is no longer linked."""
+        dota_id = ID.steam_to_dota(steam_id)
+        self._discord_ids.get(dota_id, set()).discard(discord_id)
+        if not self._discord_ids.get(dota_id, True):
+            del self._discord_ids[dota_id]
+
+        self._dota_ids.get(discord_id, set()).discard(dota_id)
+        if not self._dota_ids.get(discord_id, True):
+            del self._dota_ids[discord_id]
+            self._members.pop(discord_id, None)
+
+    def discord_ids(self, dota_id):
+        """Returns the Discord IDs a Dota account is linked to."""
+        return self._discord_ids.get(dota_id, set())
+
+    def members(self, dota_id):
+        """Returns (member, server) pairs for everyone a Dota account is linked to."""
+        return [(member, member.server)
+                for discord_id in self._discord_ids.get(dota_id, ())
+                for member in self._members.get(discord_id, {}).values()]
+
+    def __contains__(self, dota_id):
+        return dota_id in self._discord_ids
+
+    async def on_ready(self):
+        self._members = {}
+        for server in self.bot.servers:
+            await self.on_server_join(server)
+
+    async def on_member_join(self, member):
+        self._add_member(member)
+
+    async def on_member_remove(self, member):
+        self._remove_member(member)
+
+    async def on_server_join(self, server):
+        for discord_id in self._dota_ids:
+            member = server.get_member(discord_id)
+            if member is not None:
+                self._add_member(member)
+
+    async def on_server_remove(self, server):
+        for servers in self._members.values():
+            servers.pop(server.id, None)
+        self._members = {k: v for k, v in self._members.items() if v}
@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+from . import cache, ratelimit
+
+
+class MMRCache:
+    """Solo and party MMR keyed by dota_id, served stale while revalidating.
+
+    ``fetch`` is a coroutine function that asks the Game Coordinator for
+    the (solo, party) MMR of a dota_id. Entries younger than ``ttl`` are
+    served without any GC traffic. Older entries are still served at once
+    and refreshed in the background, so only dota_ids that were never
+    looked up (or were evicted after ``max_age``) have to wait. At most one
+    lookup per dota_id is in flight, and all lookups share a limit of
+    ``per_minute`` GC requests, with cache misses going first.
+    """
+
+    def __init__(self, fetch, *, ttl=3600.0, max_age=7 * 86400.0, per_minute=30, maxsize=5000, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.fetch = fetch
+        self.ttl = ttl
+        self.limiter = ratelimit.TokenBucket(per_minute / 60.0, burst=min(per_minute, 5), loop=self.loop)
+        self._cache = cache.LRUCache(maxsize=maxsize, ttl=max_age)
+        self._in_flight = {}
+
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+    def __contains__(self, dota_id):
+        return dota_id in self._cache
+
+    async def get(self, dota_id):
+        """Returns the (solo, party) MMR for a dota_id.
+
+        Only a cache miss waits for the GC, and its errors are raised."""
+        entry = self._cache.get(dota_id)
+        if entry is None:
+            return await asyncio.shield(self.refresh(dota_id, ratelimit.INTERACTIVE))
+
+        fetched, value = entry
+        if time.monotonic() - fetched >= self.ttl:
+            self.refresh(dota_id)
+        return value
+
+    def refresh(self, dota_id, priority=ratelimit.BACKGROUND):
+        """Starts a lookup for a dota_id unless one is already running.
+
+        Returns the lookup task."""
+        task = self._in_flight.get(dota_id)
+        if task is None:
+            task = self.loop.create_task(self._fetch(dota_id, priority))
+            self._in_flight[dota_id] = task
+            task.add_done_callback(lambda t: self._refresh_done(dota_id, t))
+        return task
+
+    async def _fetch(self, dota_id, priority):
+        await self.limiter.acquire(priority)
+        value = await self.fetch(dota_id)
+        self._cache.put(dota_id, (time.monotonic(), value))
+        self.refreshes += 1
+        return value
+
+    def _refresh_done(self, dota_id, task):
+        self._in_flight.pop(dota_id, None)
+        # Retrieve the exception so failed background refreshes are not
+        # reported as never retrieved. The stale value stays in place.
+        if not task.cancelled() and task.exception() is not None:
+            self.refresh_errors += 1
+
+    def stats(self):
+        return [
+            ('Cached accounts', len(self._cache)),
+            ('Hit rate', '{0:.1%}'.format(self._cache.hit_rate)),
+            ('GC lookups', self.refreshes),
+            ('GC lookup errors', self.refresh_errors),
+            ('Lookups in flight', len(self._in_flight)),
+            ('Queued lookups', self.limiter.queue_depth),
+        ]
@@ -0,0 +1,150 @@
+"""A local stand-in for Node/mt5abot-node.js.
+
+It speaks the same zerorpc protocol and implements the same methods with
+canned data, so the bot and noderpc.Client can be run without Steam or
+the Game Coordinator. Run it with ``python -m Cogs.Utils.node_standin``.
+"""
+
+import asyncio
+import json
+import sys
+import traceback
+
+import zmq
+import zmq.asyncio
+
+from .noderpc import ADDRESS, pack_event, unpack_event
+
+
+class StandInServer:
+    """Serves the Node service methods from in-memory data.
+
+    ``mmr`` maps dota IDs to (solo, party) MMR and ``rich_presence`` maps
+    Steam IDs to rich presence data. Every method waits ``latency``
+    seconds before replying. Like the real service, get_rich_presence
+    replies ``busy`` while another rich presence request is running.
+    """
+
+    def __init__(self, address=ADDRESS, *, mmr=None, rich_presence=None, latency=0.0, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.address = address
+        self.mmr = mmr if mmr is not None else {}
+        self.rich_presence = rich_presence if rich_presence is not None else {}
+        self.latency = latency
+        self.gc_ready = True
+        self.pending_links = {}
+        self.verified = {}
+        self.calls = 0
+        self._rich_presence_locked = False
+
+        self.methods = {
+            'hello': self.hello,
+            'status': self.status,
+            'gc_status': self.gc_status,
+            'get_mmr_for_dotaid': self.get_mmr_for_dotaid,
+            'verify_check': self.verify_check,
+            'delete_key': self.delete_key,
+            'add_pending_discord_link': self.add_pending_discord_link,
+            'del_pending_discord_link': self.del_pending_discord_link,
+            'get_rich_presence': self.get_rich_presence,
+        }
+
+        self._context = zmq.asyncio.Context()
+        self._socket = None
+        self._server = None
+
+    def start(self):
+        self._socket = self._context.socket(zmq.ROUTER)
+        self._socket.setsockopt(zmq.LINGER, 0)
+        self._socket.bind(self.address)
+        self._server = self.loop.create_task(self._serve())
+
+    def close(self):
+        if self._server is not None:
+            self._server.cancel()
+        if self._socket is not None:
+            self._socket.close()
+        self._context.term()
+
+    async def _serve(self):
+        while True:
+            frames = await self._socket.recv_multipart()
+            identity, payload = frames[:-2], frames[-1]
+            header, name, args = unpack_event(payload)
+            if name == '_zpc_hb':
+                continue
+            self.loop.create_task(self._handle(identity, header['message_id'], name, args))
+
+    async def _handle(self, identity, message_id, name, args):
+        self.calls += 1
+        method = self.methods.get(name)
+        try:
+            if method is None:
+                raise NameError('Unknown method {}'.format(name))
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            event, reply = 'OK', [await method(*args)]
+        except Exception as e:
+            event, reply = 'ERR', [type(e).__name__, str(e), traceback.format_exc()]
+
+        _, payload = pack_event(event, reply, response_to=message_id)
+        await self._socket.send_multipart(identity + [b'', payload])
+
+    # Node service methods
+
+    async def hello(self, name=None):
+        return 'Hello, {}'.format(name)
+
+    async def status(self):
+        return [True, self.gc_ready]
+
+    async def gc_status(self):
+        return self.gc_ready
+
+    async def get_mmr_for_dotaid(self, dotaid=None):
+        if not dotaid:
+            raise ValueError('Bad arguments')
+        if not self.gc_ready:
+            return False
+        return list(self.mmr.get(str(dotaid), (None, None)))
+
+    async def verify_check(self, discordid, vkey):
+        steamid = self.pending_links.get(discordid)
+        if steamid is None:
+            raise KeyError('Unregistered')
+        return steamid if vkey == self.verified.get(discordid) else False
+
+    async def delete_key(self, discordid):
+        return self.verified.pop(discordid, None) is not None
+
+    async def add_pending_discord_link(self, steamid, discordid):
+        if self.pending_links.get(discordid) == steamid:
+            return False
+        self.pending_links[discordid] = steamid
+        return True
+
+    async def del_pending_discord_link(self, discordid):
+        self.pending_links.pop(discordid, None)
+
+    async def get_rich_presence(self, steamids):
+        if self._rich_presence_locked:
+            raise RuntimeError('busy')
+
+        steamids = steamids if isinstance(steamids, list) else [steamids]
+        self._rich_presence_locked = True
+        try:
+            await asyncio.sleep(0.1)
+            return json.dumps({str(steamid): self.rich_presence.get(str(steamid)) for steamid in steamids})
+        finally:
+            self._rich_presence_locked = False
+
+
+if __name__ == '__main__':
+    loop = asyncio.get_event_loop()
+    server = StandInServer(sys.argv[1] if len(sys.argv) > 1 else ADDRESS, loop=loop)
+    server.start()
+    print('[Node stand-in]: Serving on {}'.format(server.address))
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        server.close()
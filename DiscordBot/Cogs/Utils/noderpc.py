@@ -0,0 +1,241 @@
+import asyncio
+import json
+import uuid
+
+import msgpack
+import zmq
+import zmq.asyncio
+
+ADDRESS = 'tcp://127.0.0.1:4242'
+
+# zerorpc protocol version and the seconds between heartbeats, matching
+# the defaults of the zerorpc server in Node/mt5abot-node.js
+PROTOCOL_VERSION = 3
+HEARTBEAT = 5.0
+
+
+class RemoteError(Exception):
+    """An error replied by the remote method, e.g. ``busy``."""
+
+    def __init__(self, name, msg, tb=None):
+        super().__init__('{0}: {1}'.format(name, msg))
+        self.name = name
+        self.msg = msg
+        self.tb = tb
+
+
+class LostRemote(Exception):
+    """The connection to the server failed while a call was pending."""
+
+
+def new_message_id():
+    return uuid.uuid4().hex
+
+
+def pack_event(name, args, response_to=None):
+    """Encodes a zerorpc event, returning its message id and payload."""
+    header = {'message_id': new_message_id(), 'v': PROTOCOL_VERSION}
+    if response_to is not None:
+        header['response_to'] = response_to
+    return header['message_id'], msgpack.packb((header, name, list(args)), use_bin_type=True)
+
+
+def unpack_event(payload):
+    header, name, args = msgpack.unpackb(payload, raw=False)
+    return header, name, args
+
+
+class Client:
+    """An asyncio zerorpc client for the Node Steam/Dota service.
+
+    Every call is sent on one DEALER socket with its own message id, and
+    replies are matched back by the id they respond to. Any number of
+    calls can therefore be in flight without blocking the event loop, up
+    to ``concurrency``. Heartbeats are sent for pending calls so the
+    server keeps their channels open. Call latency is recorded per method.
+
+    If the socket fails, pending calls raise LostRemote and a new socket
+    is connected. When nothing was heard from the server for
+    ``health_interval`` seconds it is pinged with ``hello``, and the
+    socket is replaced if that goes unanswered.
+    """
+
+    def __init__(self, address=ADDRESS, *, concurrency=16, timeout=10.0, health_interval=60.0, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.address = address
+        self.timeout = timeout
+        self.health_interval = health_interval
+        self._slots = asyncio.Semaphore(concurrency)
+        self._pending = {}
+        self._checking = False
+
+        # method name -> [calls, errors, total seconds, max seconds]
+        self.latency = {}
+        self.connects = 0
+
+        self._context = zmq.asyncio.Context()
+        self._socket = None
+        self._reader = None
+        self._connect()
+        self._heartbeat = self.loop.create_task(self._send_heartbeats())
+
+    def _connect(self):
+        self._socket = self._context.socket(zmq.DEALER)
+        self._socket.setsockopt(zmq.LINGER, 0)
+        self._socket.connect(self.address)
+        self._reader = self.loop.create_task(self._read_replies(self._socket))
+        self._last_heard = self.loop.time()
+        self.connects += 1
+
+    def _reconnect(self, error):
+        """Fails every pending call and replaces the socket."""
+        print('[Node]: Connection lost, reconnecting: {}'.format(error))
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(LostRemote(str(error)))
+
+        socket, reader = self._socket, self._reader
+        self._connect()
+        reader.cancel()
+        socket.close()
+
+    async def _read_replies(self, socket):
+        try:
+            while True:
+                frames = await socket.recv_multipart()
+                self._last_heard = self.loop.time()
+                try:
+                    header, name, args = unpack_event(frames[-1])
+                except Exception as e:
+                    print('[Node]: Bad event from the server: {}'.format(e))
+                    continue
+
+                future = self._pending.get(header.get('response_to'))
+                if future is None or future.done():
+                    continue
+
+                if name == 'OK':
+                    future.set_result(args[0] if args else None)
+                elif name == 'ERR':
+                    future.set_exception(RemoteError(*args))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if socket is self._socket:
+                self._reconnect(e)
+
+    async def _send_heartbeats(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT)
+            try:
+                for message_id in list(self._pending):
+                    _, payload = pack_event('_zpc_hb', (0,), response_to=message_id)
+                    await self._socket.send_multipart([b'', payload])
+            except zmq.ZMQError as e:
+                self._reconnect(e)
+                continue
+
+            idle = self.loop.time() - self._last_heard
+            if idle >= self.health_interval and not self._pending and not self._checking:
+                self.loop.create_task(self._check_health())
+
+    async def _check_health(self):
+        self._checking = True
+        try:
+            await self.hello()
+        except (RemoteError, LostRemote):
+            pass
+        except Exception as e:
+            self._reconnect('health check failed ({})'.format(type(e).__name__))
+        finally:
+            self._checking = False
+
+    def _record(self, name, elapsed, failed):
+        entry = self.latency.setdefault(name, [0, 0, 0.0, 0.0])
+        entry[0] += 1
+        entry[1] += failed
+        entry[2] += elapsed
+        entry[3] = max(entry[3], elapsed)
+
+    async def call(self, name, *args, timeout=None):
+        """Calls a method on the Node server and returns its reply.
+
+        Raises RemoteError if the method replied with an error and
+        asyncio.TimeoutError if it did not reply within ``timeout``."""
+        with await self._slots:
+            message_id, payload = pack_event(name, args)
+            future = asyncio.Future(loop=self.loop)
+            self._pending[message_id] = future
+            start = self.loop.time()
+            failed = True
+            try:
+                await self._socket.send_multipart([b'', payload])
+                reply = await asyncio.wait_for(future, timeout or self.timeout)
+                failed = False
+                return reply
+            finally:
+                del self._pending[message_id]
+                self._record(name, self.loop.time() - start, failed)
+
+    async def call_when_free(self, name, *args, retries=25, delay=0.2):
+        """Calls a method that replies ``busy`` while it serves another caller,
+        retrying until it is free."""
+        for attempt in range(retries):
+            try:
+                return await self.call(name, *args)
+            except RemoteError as e:
+                if e.msg != 'busy':
+                    raise
+            await asyncio.sleep(delay)
+
+        raise asyncio.TimeoutError('{} stayed busy'.format(name))
+
+    def stats(self):
+        entries = [('Calls in flight', len(self._pending)), ('Connections made', self.connects)]
+        for name, (calls, errors, total, longest) in sorted(self.latency.items()):
+            entries.append((name, '{0} calls, {1} errors, {2:.0f}ms avg, {3:.0f}ms max'
+                            .format(calls, errors, total / calls * 1000, longest * 1000)))
+        return entries
+
+    async def close(self):
+        """Stops the background tasks and closes the socket.
+
+        Must be awaited while the event loop is still running."""
+        tasks = [self._heartbeat, self._reader]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        for future in self._pending.values():
+            future.cancel()
+        self._socket.close()
+        self._context.term()
+
+    # Node service methods
+
+    async def hello(self, timeout=2.0):
+        return await self.call('hello', timeout=timeout)
+
+    async def status(self):
+        return await self.call('status')
+
+    async def gc_status(self):
+        return await self.call('gc_status')
+
+    async def get_mmr_for_dotaid(self, dotaid):
+        return await self.call('get_mmr_for_dotaid', dotaid)
+
+    async def get_rich_presence(self, steamids):
+        return json.loads(await self.call_when_free('get_rich_presence', steamids))
+
+    async def verify_code(self, discordid, code):
+        return await self.call('verify_check', discordid, code)
+
+    async def delete_key(self, discordid):
+        return await self.call('delete_key', discordid)
+
+    async def add_pending_discord_link(self, steamid, discordid):
+        return await self.call('add_pending_discord_link', steamid, discordid)
+
+    async def remove_pending_discord_link(self, discordid):
+        return await self.call('del_pending_discord_link', discordid)
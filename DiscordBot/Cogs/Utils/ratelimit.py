@@ -0,0 +1,96 @@
+import asyncio
+import heapq
+import itertools
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+
+class TokenBucket:
+    """Limits how often something may happen across the whole process.
+
+    Up to ``burst`` calls go through at once, after which tokens refill at
+    ``rate`` per second. Callers waiting for a token are served by priority
+    (lower first, so ``INTERACTIVE`` before ``BACKGROUND``) and then in the
+    order they arrived. ``pause`` holds every caller back, e.g. while the
+    remote end is throttling us.
+    """
+
+    def __init__(self, rate, burst=None, *, loop=None):
+        self.loop = loop or asyncio.get_event_loop()
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = self.loop.time()
+        self._paused_until = 0.0
+        self._waiters = []
+        self._order = itertools.count()
+        self._handle = None
+
+        self.acquired = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def queue_depth(self):
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    @property
+    def average_wait(self):
+        return self.total_wait / self.acquired if self.acquired else 0.0
+
+    def _refill(self):
+        now = self.loop.time()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        return now
+
+    def _take(self):
+        now = self._refill()
+        if now < self._paused_until or self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def _schedule(self):
+        if self._handle is not None or not self._waiters:
+            return
+
+        now = self.loop.time()
+        delay = max((1 - self._tokens) / self.rate, self._paused_until - now, 0)
+        self._handle = self.loop.call_later(delay, self._wake)
+
+    def _wake(self):
+        self._handle = None
+        while self._waiters:
+            future = self._waiters[0][2]
+            if future.done():
+                # the waiter was cancelled
+                heapq.heappop(self._waiters)
+                continue
+            if not self._take():
+                break
+            heapq.heappop(self._waiters)
+            future.set_result(None)
+        self._schedule()
+
+    def pause(self, seconds):
+        """Stops handing out tokens for at least ``seconds``."""
+        self._paused_until = max(self._paused_until, self.loop.time() + seconds)
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        self._schedule()
+
+    async def acquire(self, priority=INTERACTIVE):
+        start = self.loop.time()
+        if self._waiters or not self._take():
+            future = asyncio.Future(loop=self.loop)
+            heapq.heappush(self._waiters, (priority, next(self._order), future))
+            self._schedule()
+            await future
+
+        waited = self.loop.time() - start
+        self.acquired += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
@@ -0,0 +1,58 @@
+import json
+import os
+
+
+class ReferenceTable:
+    """An ID to name lookup table. Tables are never modified once built,
+    a refresh builds a new one and swaps it in."""
+
+    __slots__ = ('_names', 'default')
+
+    def __init__(self, entries, name_key, default):
+        self._names = {entry['id']: entry[name_key] for entry in entries}
+        self.default = default
+
+    def name(self, i):
+        return self._names.get(i, self.default)
+
+    def __contains__(self, i):
+        return i in self._names
+
+    def __len__(self):
+        return len(self._names)
+
+
+class DotaData:
+    """Dota 2 reference data loaded once from the files in ``path``.
+
+    ``set_heroes`` and ``set_items`` replace a whole table in one
+    assignment, so lookups never see a half refreshed table.
+    """
+
+    def __init__(self, path='Dota'):
+        self.path = path
+        self.heroes = ReferenceTable(self._load('heroes.json')['result']['heroes'], 'localized_name', 'Unknown Hero')
+        self.items = ReferenceTable(self._load('items.json')['result']['items'], 'localized_name', 'Unknown Item')
+        self.lobbies = ReferenceTable(self._load('lobbies.json')['lobbies'], 'name', 'Unknown Lobby Type')
+        self.modes = ReferenceTable(self._load('modes.json')['modes'], 'name', 'Unknown Game Mode')
+        self.regions = ReferenceTable(self._load('regions.json')['regions'], 'name', 'Unknown Matchmaking Region')
+
+    def _load(self, file_name):
+        with open(os.path.join(self.path, file_name), 'r') as f:
+            return json.load(f)
+
+    def _save(self, file_name, data):
+        with open(os.path.join(self.path, file_name), 'w') as f:
+            json.dump(data, f, ensure_ascii=True, indent=4)
+
+    def set_heroes(self, response):
+        """Replaces the hero table with a GetHeroes response and saves it."""
+        heroes = ReferenceTable(response['result']['heroes'], 'localized_name', 'Unknown Hero')
+        self._save('heroes.json', response)
+        self.heroes = heroes
+
+    def set_items(self, response):
+        """Replaces the item table with a GetGameItems response and saves it."""
+        items = ReferenceTable(response['result']['items'], 'localized_name', 'Unknown Item')
+        self._save('items.json', response)
+        self.items = items
@@ -0,0 +1,83 @@
+import asyncio
+import heapq
+import itertools
+import traceback
+
+
+class Scheduler:
+    """Runs recurring jobs from a single task.
+
+    Jobs are identified by a key and kept in a heap ordered by their next
+    run time, so one sleeping task serves any number of them. Every time a
+    job is due ``callback(key)`` is run in its own task, with at most
+    ``concurrency`` of them running at once.
+    """
+
+    def __init__(self, callback, *, concurrency=4, loop=None):
+        self.callback = callback
+        self.loop = loop or asyncio.get_event_loop()
+        self._heap = []
+        self._jobs = {}
+        self._tokens = itertools.count()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def schedule(self, key, interval, *, delay=None):
+        """Runs the job every ``interval`` seconds, replacing any previous schedule.
+
+        The first run happens after ``delay`` seconds, or ``interval`` if not given.
+        """
+        token = next(self._tokens)
+        self._jobs[key] = (interval, token)
+        when = self.loop.time() + (interval if delay is None else delay)
+        heapq.heappush(self._heap, (when, token, key))
+
+        if self._task is None:
+            self._task = self.loop.create_task(self._run())
+        self._wakeup.set()
+
+    def cancel(self, key):
+        # The heap entry is skipped once it comes up.
+        self._jobs.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self._jobs
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def close(self):
+        self._jobs.clear()
+        self._heap.clear()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _call(self, key):
+        with await self._semaphore:
+            try:
+                await self.callback(key)
+            except Exception:
+                traceback.print_exc()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = self.loop.time()
+            while self._heap and self._heap[0][0] <= now:
+                _, token, key = heapq.heappop(self._heap)
+                job = self._jobs.get(key)
+                if job is None or job[1] != token:
+                    # cancelled or rescheduled
+                    continue
+
+                interval = job[0]
+                heapq.heappush(self._heap, (now + interval, token, key))
+                self.loop.create_task(self._call(key))
+
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
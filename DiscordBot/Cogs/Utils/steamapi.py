@@ -1,8 +1,14 @@
+import asyncio
+import json
+import os
+import random
 import re
+import time
 
+import aiohttp
 import requests
 
-from . import urls
+from . import cache, ratelimit, urls
 
 
 class ID(object):
@@ -38,25 +44,159 @@ class ID(object):
         return int(ID_) + cls.STEAM_TO_DOTA_CONSTANT
 
 
+# How long responses of each endpoint stay cached, in seconds. None caches
+# forever, endpoints that are not listed are never cached.
+# GetHeroes and GetGameItems are only called by the refresh commands, which
+# must see fresh data, so they are deliberately left out.
+CACHE_TTLS = {
+    urls.GET_MATCH_DETAILS: None,
+    urls.GET_PLAYER_SUMMARIES: 5 * 60,
+    urls.GET_MATCH_HISTORY: 30,
+    urls.GET_LEAGUE_LISTING: 60 * 60,
+    urls.RESOLVE_VANITY_URL: 60 * 60,
+}
+
+
+# Error responses, e.g. for a match that is not available yet, are only
+# cached this long so the request is retried soon after.
+ERROR_TTL = 30
+
+
+def is_error_response(response):
+    result = response.get('result') if isinstance(response, dict) else None
+    return isinstance(result, dict) and 'error' in result
+
+
+# GetPlayerSummaries accepts at most this many Steam IDs per call.
+PLAYER_SUMMARIES_LIMIT = 100
+
+
+def chunk_steam_ids(steam_ids, size=PLAYER_SUMMARIES_LIMIT):
+    # Sorted so the same set of IDs always makes the same (cacheable) calls.
+    steam_ids = sorted({str(steam_id) for steam_id in steam_ids})
+    return [steam_ids[i:i + size] for i in range(0, len(steam_ids), size)]
+
+
+def format_arg(value):
+    if isinstance(value, (list, tuple, set)):
+        return ','.join(str(v) for v in value)
+    return value
+
+
+def request_key(api_path, args):
+    """Identifies a request regardless of the order of its arguments."""
+    return api_path + '?' + '&'.join('%s=%s' % (k, format_arg(args[k])) for k in sorted(args))
+
+
+class ResponseCache:
+    """Caches parsed Steam Web API responses.
+
+    Entries expire according to the TTL of their endpoint and the least
+    recently used ones are evicted past ``maxsize``. If a ``path`` is given
+    the live entries are loaded from it on creation and written back by
+    ``save``.
+    """
+
+    def __init__(self, ttls=CACHE_TTLS, maxsize=2048, path=None):
+        self.ttls = ttls
+        self.path = path
+        self._cache = cache.LRUCache(maxsize=maxsize)
+        if path is not None:
+            self.load()
+
+    def get(self, api_path, args):
+        if api_path not in self.ttls:
+            return None
+        return self._cache.get(request_key(api_path, args))
+
+    def put(self, api_path, args, response):
+        if api_path in self.ttls and response:
+            ttl = self.ttls[api_path]
+            if is_error_response(response):
+                ttl = ERROR_TTL if ttl is None else min(ttl, ERROR_TTL)
+            self._cache.put(request_key(api_path, args), response, ttl=ttl)
+
+    @property
+    def hits(self):
+        return self._cache.hits
+
+    @property
+    def misses(self):
+        return self._cache.misses
+
+    @property
+    def hit_rate(self):
+        return self._cache.hit_rate
+
+    def __len__(self):
+        return len(self._cache)
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+
+        now = time.time()
+        for key, response, expires in entries:
+            if is_error_response(response):
+                # saved by versions that cached errors forever
+                continue
+            if expires is None:
+                self._cache.put(key, response, ttl=None)
+            elif expires > now:
+                self._cache.put(key, response, ttl=expires - now)
+
+    def save(self):
+        now = time.time()
+        entries = [(key, response, None if left is None else now + left)
+                   for key, response, left in self._cache.items()]
+
+        temp = self.path + '.tmp'
+        with open(temp, 'w') as f:
+            json.dump(entries, f, ensure_ascii=True, separators=(',', ':'))
+        os.replace(temp, self.path)
+
+
 class SteamAPI:
     # https://wiki.teamfortress.com/wiki/WebAPI
     # https://developer.valvesoftware.com/wiki/Steam_Web_API
     # http://dev.dota2.com/showthread.php?t=58317
-    def __init__(self, api_key, attempts=1):
+    def __init__(self, api_key, attempts=1, cache=None):
         self.steam_api_key = api_key
         self.api_attempts = attempts
+        self.cache = cache
 
-    def get_api_call(self, api_path, **args):
+    def stats(self):
+        """Returns (name, value) pairs describing the client's activity."""
+        if self.cache is None:
+            return []
+
+        return [
+            ('Cached Responses', len(self.cache)),
+            ('Cache Hits', self.cache.hits),
+            ('Cache Hit Rate', '{:.1%}'.format(self.cache.hit_rate)),
+        ]
+
+    def build_api_call(self, api_path, args):
         api_call = urls.BASE_URL + api_path + '?key=%s' % self.steam_api_key
 
-        raw_request = False
+        for key, value in args.items():
+            api_call += '&%s=%s' % (key, format_arg(value))
 
-        for key in args:
-            if key == 'raw_request':
-                raw_request = args[key]
-                continue
+        return api_call
+
+    def get_api_call(self, api_path, **args):
+        raw_request = args.pop('raw_request', False)
+        args.pop('priority', None)
+        use_cache = self.cache is not None and not raw_request
+        if use_cache:
+            cached = self.cache.get(api_path, args)
+            if cached is not None:
+                return cached
 
-            api_call += '&%s=%s' % (key, args[key])
+        api_call = self.build_api_call(api_path, args)
 
         json = {}
         attempts = 0
@@ -71,19 +211,22 @@ class SteamAPI:
 
             json = request_data.json()
 
+        if use_cache:
+            self.cache.put(api_path, args, json)
+
         return json if not raw_request else request_data
 
-    def get_league_listing(self, raw_request=False):
+    def get_league_listing(self, raw_request=False, priority=None):
         args = {k: v for k, v in locals().items() if v is not None and k is not 'self'}
 
         return self.get_api_call(urls.GET_LEAGUE_LISTING, **args)
 
-    def get_live_league_games(self, raw_request=False):
+    def get_live_league_games(self, raw_request=False, priority=None):
         args = {k: v for k, v in locals().items() if v is not None and k is not 'self'}
 
         return self.get_api_call(urls.GET_LIVE_LEAGUE_GAMES, **args)
 
-    def get_match_details(self, match_id=None, raw_request=False):
+    def get_match_details(self, match_id=None, raw_request=False, priority=None):
         args = {k: v for k, v in locals().items() if v is not None and k is not 'self'}
 
         return self.get_api_call(urls.GET_MATCH_DETAILS, **args)
@@ -91,27 +234,27 @@ class SteamAPI:
     def get_match_history(self,
                           hero_id=None, game_mode=None, skill=None, min_players=None,
                           account_id=None, league_id=None, start_at_match_id=None,
-                          matches_requested=None, tournament_games_only=None, raw_request=False):
+                          matches_requested=None, tournament_games_only=None, raw_request=False, priority=None):
         args = {k: v for k, v in locals().items() if v is not None and k is not 'self'}
 
         return self.get_api_call(urls.GET_MATCH_HISTORY, **args)
 
-    def get_match_history_by_seq_num(self, start_at_match_seq_num=None, matches_requested=None, raw_request=False):
+    def get_match_history_by_seq_num(self, start_at_match_seq_num=None, matches_requested=None, raw_request=False, priority=None):
         args = {k: v for k, v in locals().items() if v is not None and k is not 'self'}
 
         return self.get_api_call(urls.GET_MATCH_HISTORY_BY_SEQ_NUM, **args)
 
-    def get_team_info_by_team_id(self, start_at_team_id=None, teams_requested=None, raw_request=False):
+    def get_team_info_by_team_id(self, start_at_team_id=None, teams_requested=None, raw_request=False, priority=None):
         args = {k: v for k, v in locals().items() if v is not None and k is not 'self'}
 
         return self.get_api_call(urls.GET_TEAM_INFO_BY_TEAM_ID, **args)
 
-    def get_heroes(self, language='en_us', raw_request=False):
+    def get_heroes(self, language='en_us', raw_request=False, priority=None):
         args = {k: v for k, v in locals().items() if v is not None and k is not 'self'}
 
         return self.get_api_call(urls.GET_HEROES, **args)
 
-    def get_game_items(self, language='en_us', raw_request=False):
+    def get_game_items(self, language='en_us', raw_request=False, priority=None):
         args = {k: v for k, v in locals().items() if v is not None and k is not 'self'}
 
         return self.get_api_call(urls.GET_GAME_ITEMS, **args)
@@ -121,18 +264,47 @@ class SteamAPI:
 
         return self.get_api_call(urls.GET_TOURNAMENT_PRIZE_POOL, **args)
 
-    def get_player_summaries(self, steamids, raw_request=False):
+    def get_player_summaries(self, steamids, raw_request=False, priority=None):
         args = {k: v for k, v in locals().items() if v is not None and k is not 'self'}
 
         return self.get_api_call(urls.GET_PLAYER_SUMMARIES, **args)
 
-    def resolve_vanity_url(self, vanityurl, raw_request=False):
+    def resolve_vanity_url(self, vanityurl, raw_request=False, priority=None):
         args = {k: v for k, v in locals().items() if v is not None and k is not 'self'}
 
         return self.get_api_call(urls.RESOLVE_VANITY_URL, **args)
 
+    def get_players(self, steam_ids, priority=None):
+        """Gets player summaries for any number of Steam IDs.
+
+        Returns a dict of summaries keyed by Steam ID (as a string).
+        """
+        players = {}
+        for chunk in chunk_steam_ids(steam_ids):
+            response = self.get_player_summaries(chunk, priority=priority)
+            for player in response['response']['players']:
+                players[player['steamid']] = player
+
+        return players
+
     # Gets a Steam ID from something. Returns None if it couldn't figure it out.
     def determine_steam_id(self, steamthing):
+        maybesteamid, vanityurl = self.parse_steam_id(steamthing)
+
+        if vanityurl is not None:
+            try:
+                result = self.resolve_vanity_url(vanityurl)['response']
+            except:
+                return False
+
+            maybesteamid = result['steamid'] if result['success'] == 1 else None
+
+        print('[SteamAPI] Determined that steamid for %s is %s' % (steamthing, maybesteamid))
+        return int(maybesteamid) if maybesteamid is not None else None
+
+    # Works out what a Steam ID identifier refers to without any API calls.
+    # Returns the Steam ID, or the vanity URL that still needs resolving.
+    def parse_steam_id(self, steamthing):
         steamthing = str(steamthing)
 
         if steamthing.startswith('STEAM_'):
@@ -143,15 +315,7 @@ class SteamAPI:
             maybesteamid = [x for x in steamthing.split('/') if x][-1]
 
         elif 'steamcommunity.com/id/' in steamthing:
-            try:
-                result = self.resolve_vanity_url([x for x in steamthing.split('/') if x][-1])['response']
-            except:
-                return False
-
-            if result['success'] == 1:
-                maybesteamid = result['steamid']
-            else:
-                maybesteamid = None
+            return None, [x for x in steamthing.split('/') if x][-1]
 
         elif 'dotabuff.com/players/' in steamthing:
             match = re.search(r'/players/(\d+)', steamthing)
@@ -165,15 +329,159 @@ class SteamAPI:
             if match:
                 maybesteamid = ID(match.string).steam_id
             else:
-                try:
-                    result = self.resolve_vanity_url(steamthing)['response']
-                except:
-                    return False
+                return None, steamthing
+
+        return maybesteamid, None
+
+
+class AsyncSteamAPI(SteamAPI):
+    """SteamAPI for use from coroutines.
+
+    Every API method returns a coroutine instead of blocking. All requests
+    go through one aiohttp session whose connector keeps connections alive
+    and caps how many are open at once, so share a single instance.
+
+    Identical requests made while one is already in flight wait for that
+    one and share its response instead of being sent again.
+
+    Requests are paced by ``limiter``, a token bucket shared by the whole
+    process. Pass ``priority=ratelimit.BACKGROUND`` to any API method for
+    polling work so that interactive commands are served first. When Steam
+    answers 429 or 503 the limiter is paused with jittered exponential
+    backoff before retrying, up to ``max_retries`` times.
+    """
+
+    def __init__(self, api_key, attempts=1, cache=None, *, loop=None, session=None, connections=8, timeout=4.0,
+                 limiter=None, max_retries=4, backoff=1.0, max_backoff=60.0):
+        super().__init__(api_key, attempts, cache)
+        self.loop = loop or asyncio.get_event_loop()
+        self.timeout = timeout
+        self.limiter = limiter or ratelimit.TokenBucket(5.0, loop=self.loop)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.throttled = 0
+        if session is None:
+            connector = aiohttp.TCPConnector(limit=connections, loop=self.loop)
+            session = aiohttp.ClientSession(connector=connector, loop=self.loop)
+        self.session = session
+        self.deduplicated = 0
+        self._in_flight = {}
+
+    def stats(self):
+        entries = super().stats()
+        entries.extend([
+            ('Deduplicated Requests', self.deduplicated),
+            ('Throttled Responses', self.throttled),
+            ('Queue Depth', self.limiter.queue_depth),
+            ('Average Wait', '{:.2f}s'.format(self.limiter.average_wait)),
+            ('Max Wait', '{:.2f}s'.format(self.limiter.max_wait)),
+        ])
+        return entries
+
+    async def close(self):
+        closed = self.session.close()
+        # ClientSession.close is a coroutine in later aiohttp versions
+        if closed is not None:
+            await closed
+
+    async def _request(self, api_call):
+        async with self.session.get(api_call) as request_data:
+            if request_data.status in [429, 503]:
+                return request_data, None
+
+            if request_data.status != 200:
+                print('[SteamAPI] API call failure:', request_data.status, request_data.reason, api_call.split('/')[-3:-2])
+
+            return request_data, await request_data.json()
+
+    def get_backoff(self, retry):
+        # "full jitter": anywhere between no wait and the exponential cap
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** retry))
+
+    async def get_api_call(self, api_path, **args):
+        raw_request = args.pop('raw_request', False)
+        priority = args.pop('priority', None)
+        if priority is None:
+            priority = ratelimit.INTERACTIVE
+
+        if raw_request:
+            return await self._fetch(api_path, args, priority, raw_request=True)
+
+        if self.cache is not None:
+            cached = self.cache.get(api_path, args)
+            if cached is not None:
+                return cached
+
+        key = request_key(api_path, args)
+        task = self._in_flight.get(key)
+        if task is None:
+            task = self._in_flight[key] = self.loop.create_task(self._fetch(api_path, args, priority))
+            task.add_done_callback(lambda t: self._in_flight.pop(key, None))
+        else:
+            self.deduplicated += 1
+
+        # shielded so one caller giving up does not cancel it for the others
+        return await asyncio.shield(task)
+
+    async def _fetch(self, api_path, args, priority, *, raw_request=False):
+        api_call = self.build_api_call(api_path, args)
+
+        json = {}
+        attempts = 0
+        retries = 0
+        request_data = None
+
+        while json == {} and attempts < self.api_attempts:
+            await self.limiter.acquire(priority)
+            request_data, json = await asyncio.wait_for(self._request(api_call), self.timeout)
+
+            if json is None:
+                # Steam is throttling us, so slow every caller down
+                json = {}
+                self.throttled += 1
+                if retries >= self.max_retries:
+                    break
+                self.limiter.pause(self.get_backoff(retries))
+                retries += 1
+                continue
+
+            attempts += 1
+            if json == {} and attempts < self.api_attempts:
+                await asyncio.sleep(self.get_backoff(attempts - 1))
+
+        if self.cache is not None and not raw_request:
+            self.cache.put(api_path, args, json)
+
+        return json if not raw_request else request_data
+
+    async def get_players(self, steam_ids, priority=None):
+        """Gets player summaries for any number of Steam IDs.
+
+        The IDs are fetched 100 at a time, with all chunks requested
+        concurrently. Returns a dict of summaries keyed by Steam ID (as a
+        string).
+        """
+        chunks = chunk_steam_ids(steam_ids)
+        responses = await asyncio.gather(*[self.get_player_summaries(chunk, priority=priority) for chunk in chunks])
+
+        players = {}
+        for response in responses:
+            for player in response['response']['players']:
+                players[player['steamid']] = player
+
+        return players
+
+    async def determine_steam_id(self, steamthing):
+        maybesteamid, vanityurl = self.parse_steam_id(steamthing)
+
+        if vanityurl is not None:
+            try:
+                result = (await self.resolve_vanity_url(vanityurl))['response']
+            except:
+                return False
 
-                if result['success'] == 1:
-                    maybesteamid = result['steamid']
-                else:
-                    maybesteamid = None
+            maybesteamid = result['steamid'] if result['success'] == 1 else None
 
         print('[SteamAPI] Determined that steamid for %s is %s' % (steamthing, maybesteamid))
-        return int(maybesteamid)
\ No newline at end of file
+        return int(maybesteamid) if maybesteamid is not None else None
\ No newline at end of file
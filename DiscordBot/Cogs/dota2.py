@@ -1,14 +1,70 @@
 import asyncio
-import datetime
-import json
+import collections
 import time
 
 import discord.utils
-import requests
 from discord.ext import commands
 from lxml import html
 
-from .Utils import checks, db, steamapi, zrpc
+from .Utils import cache, checks, database, formats, mmr, ratelimit, steamapi
+
+
+class ParsedMatch:
+    """A match with every part that does not depend on the guild rendered.
+
+    ``players`` holds (account_id, is_radiant, stats) for each player, where
+    stats is the text of the player's blurb below their name.
+    """
+
+    __slots__ = ('match_id', 'header', 'players')
+
+    def __init__(self, match_id, header, players):
+        self.match_id = match_id
+        self.header = header
+        self.players = players
+
+    @classmethod
+    def from_match_info(cls, cog, match_info):
+        header = ("Lobby Type -- {0}\n"
+                  "Game Mode -- {1}\n"
+                  "Region -- {2}\n"
+                  "Duration -- {3}\n"
+                  "Winning Team -- {4}\n\n"
+                  "<http://www.dotabuff.com/matches/{5}>\n\n".format(
+                      cog.get_lobby_name(match_info['lobby_type']),
+                      cog.get_mode_name(match_info['game_mode']),
+                      cog.get_region_name(match_info['cluster']),
+                      cog.get_game_length(match_info['duration']),
+                      "Radiant" if match_info['radiant_win'] else "Dire",
+                      match_info['match_id']))
+
+        players = tuple(
+            (player.get('account_id'), index < 5,
+             "Hero -- {0}\n"
+             "Level -- {1}\n"
+             "K/D/A -- {2}/{3}/{4}\n"
+             "GPM -- {5}\n\n".format(cog.get_hero_name(player['hero_id']), player['level'], player['kills'],
+                                     player['deaths'], player['assists'], player['gold_per_min']))
+            for index, player in enumerate(match_info['players']))
+
+        return cls(match_info['match_id'], header, players)
+
+    def render(self, player_name):
+        """Renders the match with a blurb for every player that
+        player_name(account_id) returns a name for."""
+        parts = [self.header]
+        team = None
+        for account_id, is_radiant, stats in self.players:
+            name = player_name(account_id)
+            if name is None:
+                continue
+            if team is not is_radiant:
+                parts.append("__**Radiant Team**__\n\n" if is_radiant else "__**Dire Team**__\n\n")
+                team = is_radiant
+            parts.append("__Player -- {0}__\n".format(name))
+            parts.append(stats)
+
+        return ''.join(parts)
 
 
 class Dota2:
@@ -17,45 +73,65 @@ class Dota2:
     def __init__(self, bot):
 
         self.bot = bot
-        self.steam_api = steamapi.SteamAPI(bot.steam_api_key)
-        with open("Dota/heroes.json", 'r') as f:
-            self.heroes = json.load(f)['result']['heroes']
-        with open("Dota/items.json", 'r') as f:
-            self.items = json.load(f)['result']['items']
-        with open("Dota/lobbies.json", 'r') as f:
-            self.lobbies = json.load(f)['lobbies']
-        with open("Dota/modes.json", 'r') as f:
-            self.modes = json.load(f)['modes']
-        with open("Dota/regions.json", 'r') as f:
-            self.regions = json.load(f)['regions']
-
-        self.notable_players = db.Database("Dota/notable_players.json")
-
-        self.match_strings = []
-        #self.loop = asyncio.get_event_loop()
-        #self.loop.create_task(self.run_match_ticker())
-
-        self.last_match_seq = {}
+        self.steam_api = bot.steam_api
+        self.dota_data = bot.dota_data
+
+        self.notable_players = database.connect("Dota/notable_players.json")
+
+        # Seconds a single account gets when looking up a member's latest match
+        self.match_lookup_timeout = 10.0
+        # Matches are parsed once, then rendered for every guild they are posted to
+        self.parsed_matches = cache.LRUCache(maxsize=500, ttl=3600.0)
+        self.mmr_cache = mmr.MMRCache(self.fetch_mmr, loop=bot.loop)
+
+        # Position in the global match sequence the ticker reads from. It is
+        # saved write-behind, so a crash replays at most flush_interval
+        # seconds worth of matches.
+        self.ticker_state = database.connect("Dota/ticker_state.json", write_behind=True,
+                                             flush_interval=30.0, loop=bot.loop)
+        self.match_seq_num = None
+        self.ticker_page_size = 100
+        # How far back a restart may resume before skipping ahead, and how
+        # many of the missed matches each server gets posted
+        self.ticker_max_backlog = 50000
+        self.ticker_catch_up_posts = 3
+        self.catching_up = False
+        self.backlog = {}
+        # Servers that can be posted to at the same time, and how long one
+        # server gets before its posts for a page are abandoned
+        self.ticker_concurrency = 8
+        self.ticker_timeout = 30.0
+        self.ticker_semaphore = asyncio.Semaphore(self.ticker_concurrency)
+        self.last_cycle_duration = None
+        self.ticker = bot.loop.create_task(self.run_match_ticker())
+
+    def __unload(self):
+        self.ticker.cancel()
+        self.bot.loop.create_task(self.ticker_state.flush())
 
     @commands.command(hidden=True)
     @checks.is_owner()
     async def update_heroes(self):
         """Updates the internal hero database"""
-        heroes = self.steam_api.get_heroes()
-
-        with open("Dota/heroes.json", 'w') as f:
-            json.dump(heroes, f, ensure_ascii=True, indent=4)
+        try:
+            self.dota_data.set_heroes(await self.steam_api.get_heroes())
+        except (KeyError, TypeError):
+            await self.bot.say("The Steam Web API is down. Please try again later.")
+            return
 
-        self.heroes = heroes
+        await self.bot.say("Hero database updated.")
 
     @commands.command(hidden=True)
     @checks.is_owner()
     async def update_items(self):
         """Updates the internal item database"""
-        items = self.steam_api.get_game_items()
+        try:
+            self.dota_data.set_items(await self.steam_api.get_game_items())
+        except (KeyError, TypeError):
+            await self.bot.say("The Steam Web API is down. Please try again later.")
+            return
 
-        with open("Dota/items.json", 'w') as f:
-            json.dump(items, f, ensure_ascii=True, indent=4)
+        await self.bot.say("Item database updated.")
 
     @commands.command(hidden=True)
     @checks.is_owner()
@@ -63,8 +139,9 @@ class Dota2:
         headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) '
                    'Chrome/47.0.2526.111 Safari/537.36'}
         url = 'http://dotabuff.com/players/verified'
-        response = requests.get(url, headers=headers)
-        tree = html.fromstring(response.content)
+        async with self.steam_api.session.get(url, headers=headers) as response:
+            content = await response.read()
+        tree = html.fromstring(content)
 
         urls = tree.xpath('//a[contains(@href,"players")and @class = "link-type-player"]/@href')
         names = tree.xpath('//a[contains(@href,"players")and @class = "link-type-player"]/text()')
@@ -83,6 +160,43 @@ class Dota2:
         await self.notable_players.put(dota_id, name)
         await self.bot.say("Notable player added.")
 
+    @commands.command(hidden=True)
+    @checks.is_owner()
+    async def steam_api_stats(self):
+        """Shows Steam Web API client statistics"""
+        entries = self.steam_api.stats()
+        if not entries:
+            await self.bot.say("No statistics are being collected.")
+            return
+
+        await formats.entry_to_code(self.bot, entries)
+
+    @commands.command(hidden=True)
+    @checks.is_owner()
+    async def mmr_stats(self):
+        """Shows MMR cache statistics"""
+        await formats.entry_to_code(self.bot, self.mmr_cache.stats())
+
+    @commands.command(hidden=True)
+    @checks.is_owner()
+    async def zrpc_stats(self):
+        """Shows Node RPC latency statistics"""
+        await formats.entry_to_code(self.bot, self.bot.node.stats())
+
+    @commands.command(hidden=True)
+    @checks.is_owner()
+    async def ticker_stats(self):
+        """Shows match ticker statistics"""
+        duration = self.last_cycle_duration
+        entries = [
+            ('Match sequence number', self.match_seq_num),
+            ('Catching up', self.catching_up),
+            ('Last cycle duration', 'n/a' if duration is None else '{0:.2f}s'.format(duration)),
+            ('Concurrent servers', self.ticker_concurrency),
+            ('Server timeout', '{0}s'.format(self.ticker_timeout)),
+        ]
+        await formats.entry_to_code(self.bot, entries)
+
     @commands.command(pass_context=True)
     async def dotabuff(self, ctx, *, member: discord.Member=None):
         """Dotabuff profile links
@@ -101,21 +215,22 @@ class Dota2:
 
         msg = "__Dotabuff page(s) for {0.name}:__\n\n".format(member)
         try:
-            response = self.steam_api.get_player_summaries(steam_ids)['response']
+            players = await self.steam_api.get_players(steam_ids)
         except:
             await self.bot.say("The Steam Web API is down. Please try again later.")
-        # Response isn't in a guaranteed order.
+            return
+
         for steam_id in steam_ids:
-            for player in response['players']:
-                if player['steamid'] == steam_id:
-                    dota_id = steamapi.ID.steam_to_dota(steam_id)
-                    msg += "{0} - <https://dotabuff.com/players/{1}>\n".format(player['personaname'], dota_id)
+            player = players.get(str(steam_id))
+            if player is not None:
+                dota_id = steamapi.ID.steam_to_dota(steam_id)
+                msg += "{0} - <https://dotabuff.com/players/{1}>\n".format(player['personaname'], dota_id)
         await self.bot.say(msg)
 
-    def get_latest_match(self, steam_id):
+    async def get_latest_match(self, steam_id, priority=None):
         """Gets the latest match for a given Steam ID"""
         try:
-            req = self.steam_api.get_match_history(account_id=steam_id, matches_requested=1)
+            req = await self.steam_api.get_match_history(account_id=steam_id, matches_requested=1, priority=priority)
             result = req['result']
         except:
             return None
@@ -128,53 +243,40 @@ class Dota2:
 
         return result['matches'][0]
 
-    def get_latest_match_from_list(self, steam_ids):
-        """Gets simple match data for the latest game played from a list of IDs"""
-        latest_match = {}
+    async def get_latest_match_from_list(self, steam_ids, priority=None):
+        """Gets simple match data for the latest game played from a list of IDs
 
-        for steam_id in steam_ids:
-            match = self.get_latest_match(steam_id)
-            if match is None:
-                return None
-            if not match == {} and (latest_match == {} or latest_match['match_seq_num'] < match['match_seq_num']):
-                latest_match = match
+        The IDs are looked up concurrently. IDs whose lookup fails or times
+        out are skipped, None is only returned if every lookup failed."""
+        tasks = [asyncio.wait_for(self.get_latest_match(steam_id, priority), self.match_lookup_timeout)
+                 for steam_id in steam_ids]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        matches = [match for match in results if isinstance(match, dict)]
+        if results and not matches:
+            return None
 
-        return latest_match
+        return max((match for match in matches if match), key=lambda m: m['match_seq_num'], default={})
 
     def get_hero_name(self, i):
         """Gets a hero name for a given ID"""
-        for hero in self.heroes:
-            if hero['id'] == i:
-                return hero['localized_name']
-        return 'Unknown Hero'
+        return self.dota_data.heroes.name(i)
 
     def get_item_name(self, i):
         """Gets an item name for a given ID"""
-        for item in self.items:
-            if item['id'] == i:
-                return item['localized_name']
-        return 'Unknown Item'
+        return self.dota_data.items.name(i)
 
     def get_lobby_name(self, i):
         """Gets a lobby name for a given ID"""
-        for lobby in self.lobbies:
-            if lobby['id'] == i:
-                return lobby['name']
-        return 'Unknown Lobby Type'
+        return self.dota_data.lobbies.name(i)
 
     def get_mode_name(self, i):
         """Gets a mode name for a given ID"""
-        for mode in self.modes:
-            if mode['id'] == i:
-                return mode['name']
-        return 'Unknown Game Mode'
+        return self.dota_data.modes.name(i)
 
     def get_region_name(self, i):
         """Gets a region name for a given ID"""
-        for region in self.regions:
-            if region['id'] == i:
-                return region['name']
-        return 'Unknown Matchmaking Region'
+        return self.dota_data.regions.name(i)
 
     def get_game_length(self, duration):
         """Parses the game duration into minutes/seconds"""
@@ -182,65 +284,28 @@ class Dota2:
         seconds = int(duration % 60)
         return "{0}:{1}".format(minutes, str(seconds).zfill(2))
 
-    def get_player_blurb(self, player):
-        """Gets a string for a player in a match if they are
-        registered with the bot."""
-        dota_id = player['account_id']
-
-        name = None
-        for server in self.bot.servers:
-            for member in server.members:
-                steam_ids = self.bot.steam_info.get(member.id)
-                if steam_ids is not None:
-                    for steam_id in steam_ids:
-                        if dota_id == steamapi.ID.steam_to_dota(steam_id):
-                            name = member.name
-
-        if name is None:
-            return None
+    def get_player_name(self, account_id, server=None):
+        """Gets the name of the member a Dota account is linked to, or None.
+
+        If a server is given only members of that server are considered."""
+        for member, member_server in self.bot.linked_accounts.members(account_id):
+            if server is None or member_server.id == server.id:
+                return member.name
+        return None
+
+    def get_parsed_match(self, match_info):
+        """Gets the ParsedMatch for a match, parsing it on a cache miss"""
+        parsed = self.parsed_matches.get(match_info['match_id'])
+        if parsed is None:
+            parsed = ParsedMatch.from_match_info(self, match_info)
+            self.parsed_matches.put(parsed.match_id, parsed)
+        return parsed
 
-        hero_name = self.get_hero_name(player['hero_id'])
-        return ("__Player -- {0}__\n"
-                "Hero -- {1}\n"
-                "Level -- {2}\n"
-                "K/D/A -- {3}/{4}/{5}\n"
-                "GPM -- {6}\n\n".format(name, hero_name, player['level'], player['kills'],
-                                    player['deaths'], player['assists'], player['gold_per_min']))
-
-    def parse_match(self, match_info):
-        lobby_name = self.get_lobby_name(match_info['lobby_type'])
-        mode_name = self.get_mode_name(match_info['game_mode'])
-        region_name = self.get_region_name(match_info['cluster'])
-        game_length = self.get_game_length(match_info['duration'])
-        winning_team = "Radiant" if match_info['radiant_win'] else "Dire"
-
-        match_string = ''
-        match_string += "Lobby Type -- {0}\n".format(lobby_name)
-        match_string += "Game Mode -- {0}\n".format(mode_name)
-        match_string += "Region -- {0}\n".format(region_name)
-        match_string += "Duration -- {0}\n".format(game_length)
-        match_string += "Winning Team -- {0}\n\n".format(winning_team)
-
-        match_string += "<http://www.dotabuff.com/matches/{0}>\n\n".format(match_info['match_id'])
-
-        player_count = 0
-        print_rad = False
-        print_dir = False
-
-        for player in match_info['players']:
-            player_count += 1
-            player_blurb = self.get_player_blurb(player)
-
-            if player_blurb is not None:
-                if not print_rad and player_count <= 5:
-                    match_string += "__**Radiant Team**__\n\n"
-                    print_rad = True
-                if not print_dir and player_count > 5:
-                    match_string += "__**Dire Team**__\n\n"
-                    print_dir = True
-                match_string += player_blurb
-
-        return match_string
+    def parse_match(self, match_info, server=None):
+        """Renders a match with blurbs for the registered players.
+
+        If a server is given only players that are members of it get a blurb."""
+        return self.get_parsed_match(match_info).render(lambda a: self.get_player_name(a, server))
 
     @commands.command(pass_context=True)
     async def last_match(self, ctx, *, member: discord.Member=None):
@@ -260,7 +325,7 @@ class Dota2:
             return
 
         tmp = await self.bot.say("Getting latest match for linked Steam accounts.")
-        match = self.get_latest_match_from_list(steam_ids)
+        match = await self.get_latest_match_from_list(steam_ids)
 
         if match is None:
             await self.bot.delete_message(tmp)
@@ -270,14 +335,14 @@ class Dota2:
             await self.bot.edit_message(tmp, "Latest match ID found. Getting match data...")
 
             try:
-                match_info = self.steam_api.get_match_details(match['match_id'])['result']
+                match_info = (await self.steam_api.get_match_details(match['match_id']))['result']
             except:
                 await self.bot.delete_message(tmp)
                 await self.bot.say("The Steam Web API is down. Please try again later.")
                 return
 
             await self.bot.edit_message(tmp, "Match data received. Parsing...")
-            match_string = self.parse_match(match_info)
+            match_string = self.parse_match(match_info, ctx.message.server)
 
             await self.bot.delete_message(tmp)
 
@@ -366,72 +431,152 @@ class Dota2:
         await self.bot.dota_ticker_settings.put(server.id, settings)
         await self.bot.say('The match ticker has been enabled on {0.mention}.'.format(channel))
 
+    async def get_current_match_seq_num(self):
+        """Gets the sequence number of the most recent public match"""
+        try:
+            result = (await self.steam_api.get_match_history(matches_requested=1, priority=ratelimit.BACKGROUND))['result']
+            return result['matches'][0]['match_seq_num']
+        except:
+            return None
+
     async def run_match_ticker(self):
         print('[Dota]: Match ticker initialized')
-        while not self.loop.is_closed():
-            # Print the last time the match ticker ran for debugging
-            ts = time.time()
-            st = datetime.datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')
-            print("[Dota]: Match ticker ran at {0}".format(st))
-
-            # Make a copy of the server data
-            servers = self.bot.servers
-            # Check if any new servers got added
-            if not len(servers) == len(self.last_match_seq):
-                for server in servers:
-                    if server.id not in self.last_match_seq:
-                        self.last_match_seq[server.id] = 0
-
-            # Start a task for each server with the ticker enabled
-            num_futures = 0
-            futures = []
-            channels = []
-            for server in servers:
-                settings = self.bot.dota_ticker_settings.get(server.id)
-                if settings is not None and settings['enabled']:
-                    # Start a task for the server
-                    num_futures += 1
-                    futures.append(self.loop.run_in_executor(None, self.check_server_for_new_matches, server))
-                    channels.append(server.get_channel(settings['channel_id']))
-
-            # Report the match data
-            for x in range(num_futures):
-                match_strings = await futures[x]
-                for match_string in match_strings:
-                    await self.bot.send_message(channels[x], match_string)
-
-            await asyncio.sleep(60)
-
-    def check_server_for_new_matches(self, server):
-        new_matches = {}
-        latest_match = 0
-        match_strings = []
-
-        # Get a list of unreported matches since last check
-        for member in server.members:
-            steam_ids = self.bot.steam_info.get(member.id)
-            if steam_ids is not None:
-                # Only one latest match per player
-                match = self.get_latest_match_from_list(steam_ids)
-                if match is not None and self.last_match_seq[server.id] < match['match_seq_num']:
-                    new_matches[match['match_id']] = match
-                    latest_match = max(latest_match, match['match_seq_num'])
-
-        if self.last_match_seq[server.id] > 0:
-            for x, match in new_matches.items():
-                r = self.steam_api.get_match_details(match['match_id'])
-                if 'result' in r:
-                    match_string = "A game of Dota just ended. Match info: \n\n"
-                    match_info = r['result']
-                    match_string += self.parse_match(match_info)
-
-                    # Put the string in the parsed list
-                    match_strings.append(match_string)
-
-        # Update the latest reported match for the server.
-        self.last_match_seq[server.id] = max(self.last_match_seq[server.id], latest_match)
-
-        return match_strings
+        await self.bot.wait_until_ready()
+
+        while not self.bot.is_closed:
+            if self.match_seq_num is None:
+                await self.restore_match_seq_num()
+                caught_up = not self.catching_up
+            else:
+                caught_up = await self.check_for_new_matches()
+
+            # The page could not be read. Retry later without leaving
+            # catch-up mode, the cursor may still be far behind.
+            if caught_up is None:
+                await asyncio.sleep(60)
+                continue
+
+            if caught_up and self.catching_up:
+                await self.finish_catch_up()
+
+            # Keep reading while behind, otherwise wait for more games to finish.
+            if caught_up:
+                await asyncio.sleep(60)
+
+    async def restore_match_seq_num(self):
+        """Resumes the ticker from its saved position.
+
+        Resuming enters catch-up mode, which is skipped ahead to at most
+        ticker_max_backlog matches behind the newest one."""
+        saved = self.ticker_state.get('match_seq_num')
+        current = await self.get_current_match_seq_num()
+        if current is None:
+            # Without the newest match the backlog cannot be bounded, so
+            # leave the cursor unset and retry the restore later.
+            return
+        elif saved is None:
+            self.match_seq_num = current
+        elif current - saved > self.ticker_max_backlog:
+            print('[Dota]: Match ticker skipped {} matches'.format(current - saved - self.ticker_max_backlog))
+            self.match_seq_num = current - self.ticker_max_backlog
+        else:
+            self.match_seq_num = saved
+
+        self.catching_up = saved is not None
+        if self.catching_up:
+            print('[Dota]: Match ticker catching up from {}'.format(self.match_seq_num))
+
+    async def finish_catch_up(self):
+        """Posts the newest matches each server missed while catching up"""
+        self.catching_up = False
+        backlog, self.backlog = self.backlog, {}
+        await self.report_matches((server, list(matches)) for server, matches in backlog.values())
+        print('[Dota]: Match ticker caught up')
+
+    async def check_for_new_matches(self):
+        """Reads the next page of the global match sequence and reports
+        every match that a linked account played in.
+
+        The cost is one API call per page of matches no matter how many
+        members are linked. Returns True once the sequence is caught up,
+        or None if the page could not be read."""
+        start = time.monotonic()
+        try:
+            r = await self.steam_api.get_match_history_by_seq_num(start_at_match_seq_num=self.match_seq_num,
+                                                                  matches_requested=self.ticker_page_size,
+                                                                  priority=ratelimit.BACKGROUND)
+            matches = r['result']['matches']
+        except:
+            return None
+
+        if not matches:
+            return True
+
+        # Group the page by server so every server gets its matches in order
+        reports = {}
+        accounts = self.bot.linked_accounts
+        for match in matches:
+            servers = {}
+            for player in match['players']:
+                for member, server in accounts.members(player.get('account_id')):
+                    servers[server.id] = server
+
+            for server in servers.values():
+                reports.setdefault(server.id, (server, []))[1].append(match)
+
+        if self.catching_up:
+            # Only keep the newest few matches per server rather than
+            # posting every missed match.
+            for server, server_matches in reports.values():
+                entry = self.backlog.setdefault(server.id, (server, collections.deque(maxlen=self.ticker_catch_up_posts)))
+                entry[1].extend(server_matches)
+        elif reports:
+            await self.report_matches(reports.values())
+
+        self.match_seq_num = matches[-1]['match_seq_num'] + 1
+        await self.ticker_state.put('match_seq_num', self.match_seq_num)
+        self.last_cycle_duration = time.monotonic() - start
+        return len(matches) < self.ticker_page_size
+
+    async def report_matches(self, reports):
+        """Posts (server, matches) reports to every server at once.
+
+        Each server posts as soon as it is ready, so a slow server only
+        delays itself."""
+        reports = list(reports)
+        tasks = [self.report_to_server(server, matches) for server, matches in reports]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        for (server, matches), result in zip(reports, results):
+            if isinstance(result, Exception):
+                print('[Dota]: Match ticker failed for {0.name}: {1.__class__.__name__}: {1}'.format(server, result))
+
+    async def report_to_server(self, server, matches):
+        """Posts matches to a server's ticker channel if the ticker is enabled"""
+        settings = self.bot.dota_ticker_settings.get(server.id)
+        if settings is None or not settings['enabled']:
+            return
+
+        channel = server.get_channel(settings['channel_id'])
+        if channel is None:
+            return
+
+        with await self.ticker_semaphore:
+            try:
+                await asyncio.wait_for(self.send_matches(channel, matches), self.ticker_timeout)
+            except asyncio.TimeoutError:
+                print('[Dota]: Match ticker timed out posting to {0.name}'.format(server))
+            except discord.HTTPException as e:
+                print('[Dota]: Match ticker could not post to {0.name}: {1}'.format(server, e))
+
+    async def send_matches(self, channel, matches):
+        for match_info in matches:
+            match_string = "A game of Dota just ended. Match info: \n\n" + self.parse_match(match_info, channel.server)
+            await self.bot.send_message(channel, match_string)
+
+    async def fetch_mmr(self, dota_id):
+        """Asks the Game Coordinator for the solo and party MMR of a Dota ID"""
+        smmr, pmmr = await self.bot.node.get_mmr_for_dotaid(str(dota_id))
+        return smmr, pmmr
 
     @commands.command(pass_context=True)
     async def mmr(self, ctx, *, member: discord.Member=None):
@@ -441,13 +586,6 @@ class Dota2:
         If no member is specified then the info returned is for the user
         that invoked the command."""
 
-        # Check that the ZRPC server is up
-        try:
-            zrpc.hello()
-        except:
-            await self.bot.say("The ZRPC server is currently down.")
-            return
-
         if member is None:
             member = ctx.message.author
 
@@ -460,26 +598,36 @@ class Dota2:
         msg = "__MMR Information for {0.name}:__\n\n".format(member)
         tmp = await self.bot.say("Getting account info for linked Steam accounts.")
         try:
-            response = self.steam_api.get_player_summaries(steam_ids)['response']
+            players = await self.steam_api.get_players(steam_ids)
         except:
             await self.bot.delete_message(tmp)
             await self.bot.say("The Steam Web API is down. Please try again later.")
             return
-        # Response isn't in a guaranteed order.
+
+        accounts = [(players[str(steam_id)], steamapi.ID.steam_to_dota(steam_id)) for steam_id in steam_ids
+                    if str(steam_id) in players]
+
+        # Cached MMRs are served without asking the ZRPC server at all
+        if not all(dota_id in self.mmr_cache for player, dota_id in accounts):
+            try:
+                await self.bot.node.hello()
+            except:
+                await self.bot.delete_message(tmp)
+                await self.bot.say("The ZRPC server is currently down.")
+                return
+
         await self.bot.edit_message(tmp, 'Account data received. Fetching Dota 2 profile cards...')
-        for steam_id in steam_ids:
-            for player in response['players']:
-                if player['steamid'] == steam_id:
-                    dota_id = steamapi.ID.steam_to_dota(steam_id)
-                    try:
-                        smmr, pmmr = zrpc.get_mmr_for_dotaid(str(dota_id))
-                    except:
-                        await self.bot.delete_message(tmp)
-                        await self.bot.say("Profile cards are down. Please try again later.")
-                        return
-                    msg += "{0} - Solo MMR: {1} | Party MMR: {2}\n"\
-                        .format(player['personaname'], smmr if smmr is not None else 'Hidden',
-                                pmmr if pmmr is not None else 'Hidden')
+        try:
+            mmrs = await asyncio.gather(*[self.mmr_cache.get(dota_id) for player, dota_id in accounts])
+        except:
+            await self.bot.delete_message(tmp)
+            await self.bot.say("Profile cards are down. Please try again later.")
+            return
+
+        for (player, dota_id), (smmr, pmmr) in zip(accounts, mmrs):
+            msg += "{0} - Solo MMR: {1} | Party MMR: {2}\n"\
+                .format(player['personaname'], smmr if smmr is not None else 'Hidden',
+                        pmmr if pmmr is not None else 'Hidden')
         await self.bot.delete_message(tmp)
         await self.bot.say(msg)
 
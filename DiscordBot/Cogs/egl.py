@@ -57,7 +57,7 @@ class EGL:
 
     def __init__(self, bot):
         self.bot = bot
-        self.egl_db = database.Database('egl.json')
+        self.egl_db = database.connect('egl.json')
 
     async def on_member_join(self, member):
         if self.bot.debug_mode:
@@ -172,8 +172,7 @@ class EGL:
 
         This command can only be used by server admins.
         """
-        survey = self.egl_db.get('survey', {})
-        survey['intro'] = text
+        await self.egl_db.set_in('survey', 'intro', text)
         await self.bot.say("New intro set.")
 
     @survey.group( pass_context=True)
@@ -196,8 +195,7 @@ class EGL:
             position = sys.maxsize
 
         questions.insert(position - 1, question)
-        survey['questions'] = questions
-        await self.egl_db.put('survey', survey)
+        await self.egl_db.set_in('survey', 'questions', questions)
 
     @add_question.command(pass_context=True)
     @is_egl_server()
@@ -387,16 +385,15 @@ class EGL:
 
         Requires Moderator or higher.
         """
-        roles = self.egl_db.get('sub_roles', [])
-        if role.name in roles:
-            await self.bot.say('This role is already subscribable')
-            return
-
         if role.permissions.value > 0:
             await self.bot.say('You cannot add a role with any permissions for server security reasons.')
             return
 
-        await self.bot.say('You can add this role to the list of subscribable roles.')
+        if not await self.egl_db.append_in('sub_roles', (), role.name, unique=True):
+            await self.bot.say('This role is already subscribable')
+            return
+
+        await self.bot.say('Role added.')
 
     @subscribe.command(name='remove', pass_context=True)
     @mod_or_bot_owner()
@@ -406,9 +403,11 @@ class EGL:
 
         Requires Moderator or higher.
         """
-        roles = self.egl_db.get('sub_roles', [])
-        roles.remove(role.name)
-        self.egl_db.put('sub_roles', roles)
+        try:
+            await self.egl_db.remove_in('sub_roles', (), role.name)
+        except (KeyError, ValueError):
+            await self.bot.say('This role is not subscribable.')
+            return
 
         await self.bot.say('Role removed.')
 
@@ -9,7 +9,7 @@ class Logging:
 
 	def __init__(self, bot):
 		self.bot = bot
-		self.logging_db = database.Database('Config/logging.json')
+		self.logging_db = database.connect('Config/logging.json')
 
 		folders = os.listdir('logs')
 		for server in bot.servers:
@@ -1,12 +1,29 @@
 from discord.ext import commands
 import discord
 import datetime
-from .Utils import checks, database
-import json
+from .Utils import cache, checks, database, formats, scheduler
 import asyncio
+import time
 from collections import Counter
 
 
+DISCORD_EPOCH = 1420070400000
+
+# Discord refuses to bulk delete messages older than two weeks. Keep a
+# little slack so a request never races the limit.
+BULK_DELETE_MAX_AGE = 14 * 24 * 60 * 60 - 60
+
+# Gateway events the starboard cares about. Everything else is dropped
+# before any work is done.
+STARBOARD_EVENTS = frozenset((
+    'MESSAGE_UPDATE',
+    'MESSAGE_DELETE',
+    'MESSAGE_DELETE_BULK',
+    'MESSAGE_REACTION_ADD',
+    'MESSAGE_REACTION_REMOVE',
+))
+
+
 class StarboardError(commands.CommandError):
     pass
 
@@ -26,20 +43,180 @@ class Starboard:
     def __init__(self, bot):
         self.bot = bot
 
-        self.stars_db = database.Database('stars.json')
-        self._message_cache = {}
+        self.stars_db = database.connect('stars.json', write_behind=True)
+        self._message_cache = cache.LRUCache(maxsize=2000, ttl=3600.0)
+
+        # guild_id -> {starboard message ID: original message ID}
+        self.build_post_index()
+
+        # starboard message ID -> task that edits it once the delay is over
+        self.edit_delay = 2.0
+        self.edits_coalesced = 0
+        self._pending_edits = {}
+
+        # (guild_id, message_id) of starboard posts that are being sent
+        self._posting = set()
+
+        # one scheduler task sweeps every guild with a janitor set
+        self.janitor = scheduler.Scheduler(self.run_janitor, loop=bot.loop)
+        for guild_id, db in self.stars_db.all().items():
+            if 'janitor' in db:
+                self.janitor.schedule(guild_id, db['janitor'])
 
     def __unload(self):
-        pass
+        self.janitor.close()
+        for task in self._pending_edits.values():
+            task.cancel()
+        self.bot.loop.create_task(self.stars_db.flush())
+
+    def build_post_index(self):
+        """Rebuilds the starboard post index from the star database."""
+        self._post_index = {
+            guild_id: {
+                data[0]: message_id
+                for message_id, data in db.items()
+                if isinstance(data, list) and data[0] is not None
+            }
+            for guild_id, db in self.stars_db.all().items()
+        }
+
+    def original_message_id(self, guild_id, bot_message_id):
+        """Maps a starboard post back to the ID of the starred message."""
+        return self._post_index.get(guild_id, {}).get(bot_message_id)
+
+    async def set_starboard_post(self, guild_id, message_id, bot_message_id):
+        await self.stars_db.set_in(guild_id, (message_id, 0), bot_message_id)
+        self._post_index.setdefault(guild_id, {})[bot_message_id] = message_id
+
+    async def pop_star_entry(self, guild_id, message_id):
+        stars = await self.stars_db.pop_in(guild_id, message_id, None)
+        if stars is not None:
+            self._post_index.get(guild_id, {}).pop(stars[0], None)
+            task = self._pending_edits.pop(stars[0], None)
+            if task is not None:
+                task.cancel()
+        return stars
+
+    async def create_post(self, guild_id, message_id, starboard_channel, star_message):
+        """Sends the starboard post for a message that has none yet.
+
+        Only one post is sent per message. Stars that arrive while it is
+        being sent only update the count, and a follow-up edit shows them.
+        """
+        key = (guild_id, message_id)
+        if key in self._posting:
+            return
+
+        self._posting.add(key)
+        try:
+            count = len(self.stars_db.get(guild_id, {})[message_id][1])
+            content, embed = self.emoji_message(star_message, count)
+            sent = await self.bot.send_message(starboard_channel, content, embed=embed)
+
+            stars = self.stars_db.get(guild_id, {}).get(message_id)
+            if stars is None or len(stars[1]) == 0:
+                # every star was removed while the post was being sent
+                await self.pop_star_entry(guild_id, message_id)
+                await self.bot.delete_message(sent)
+                return
+
+            await self.set_starboard_post(guild_id, message_id, sent.id)
+        finally:
+            self._posting.discard(key)
+
+        if len(stars[1]) != count:
+            self.queue_edit(guild_id, message_id, sent, star_message)
+
+    def queue_edit(self, guild_id, message_id, bot_msg, star_message):
+        """Edits a starboard post after ``edit_delay`` seconds.
+
+        Star changes that arrive while an edit is pending are folded into
+        it, since the edit uses the star count at the time it is sent.
+        """
+        if bot_msg.id in self._pending_edits:
+            self.edits_coalesced += 1
+            return
+
+        coro = self.edit_post(guild_id, message_id, bot_msg, star_message)
+        self._pending_edits[bot_msg.id] = self.bot.loop.create_task(coro)
+
+    async def edit_post(self, guild_id, message_id, bot_msg, star_message):
+        await asyncio.sleep(self.edit_delay)
+        # anything starred from here on needs a new edit
+        self._pending_edits.pop(bot_msg.id, None)
+
+        stars = self.stars_db.get(guild_id, {}).get(message_id)
+        if stars is None or stars[0] != bot_msg.id or len(stars[1]) == 0:
+            return
+
+        content, embed = self.emoji_message(star_message, len(stars[1]))
+        try:
+            await self.bot.edit_message(bot_msg, content, embed=embed)
+        except discord.HTTPException:
+            pass
+
+    async def clean_starboard(self, guild_id, starboard_channel, min_stars):
+        """Deletes starboard posts with ``min_stars`` stars or less.
 
-    async def clean_starboard(self, ctx, min_stars):
-        dead_messages = {
-            data[0]
-            for _, data in ctx.stars_db.items()
+        The posts are deleted by their stored IDs in bulk requests of up to
+        100. Posts too old to be bulk deleted are deleted one at a time.
+        Returns the number of posts removed.
+        """
+        dead_messages = [
+            (data[0], message_id)
+            for message_id, data in self.stars_db.get(guild_id, {}).items()
             if isinstance(data, list) and len(data[1]) <= min_stars and data[0] is not None
-        }
+        ]
+
+        cutoff = int((time.time() - BULK_DELETE_MAX_AGE) * 1000 - DISCORD_EPOCH) << 22
+        recent = [entry for entry in dead_messages if int(entry[0]) > cutoff]
+        old = [entry for entry in dead_messages if int(entry[0]) <= cutoff]
+        channel_id = starboard_channel.id
+        removed = 0
+
+        for i in range(0, len(recent), 100):
+            chunk = recent[i:i + 100]
+            try:
+                if len(chunk) == 1:
+                    await self.bot.http.delete_message(channel_id, chunk[0][0], guild_id)
+                else:
+                    await self.bot.http.delete_messages(channel_id, [bot_id for bot_id, _ in chunk], guild_id)
+            except discord.NotFound:
+                pass
+            except discord.HTTPException:
+                continue
+
+            for _, message_id in chunk:
+                await self.pop_star_entry(guild_id, message_id)
+            removed += len(chunk)
+
+        for bot_id, message_id in old:
+            try:
+                await self.bot.http.delete_message(channel_id, bot_id, guild_id)
+            except discord.NotFound:
+                pass
+            except discord.HTTPException:
+                continue
+            else:
+                await asyncio.sleep(1.0)
+
+            await self.pop_star_entry(guild_id, message_id)
+            removed += 1
+
+        return removed
+
+    async def run_janitor(self, guild_id):
+        db = self.stars_db.get(guild_id)
+        if db is None or 'janitor' not in db:
+            self.janitor.cancel(guild_id)
+            return
 
-        await self.bot.purge_from(ctx.starboard_channel, limit=1000, check=lambda m: m.id in dead_messages)
+        starboard_channel = self.bot.get_channel(db.get('channel'))
+        if starboard_channel is None:
+            # not connected yet, or the starboard is gone
+            return
+
+        await self.clean_starboard(guild_id, starboard_channel, 1)
 
     def star_emoji(self, star_count):
         if star_count <= 5:
@@ -113,11 +290,11 @@ class Starboard:
             except:
                 pass
 
-            tup = discord.utils.find(lambda t: isinstance(t[1], list) and t[1][0] == message_id, db.items())
-            if tup is None:
+            original_id = self.original_message_id(guild_id, message_id)
+            if original_id is None:
                 raise StarboardError('\N{NO ENTRY SIGN} Could not find this message ID in the starboard.')
 
-            star_message = await self.get_message(star_message.channel_mentions[0], tup[0])
+            star_message = await self.get_message(star_message.channel_mentions[0], original_id)
             if star_message is None:
                 raise StarboardError('\N{BLACK QUESTION MARK ORNAMENT} This message could not be found.')
 
@@ -131,32 +308,33 @@ class Starboard:
             raise StarboardError('\N{NO ENTRY SIGN} You cannot star your own message.')
 
         # Safe to star
-        content, embed = self.emoji_message(star_message, len(starrers) + 1)
-
         if not reaction:
             try:
                 await self.bot.delete_message(message)
             except:
                 pass
 
-        starrers.append(starrer_id)
-        db[message_id] = stars
+        # the star data might have changed while fetching the messages
+        stars = db.get(message_id)
+        if stars is None:
+            stars = [None, [starrer_id]]
+            await self.stars_db.set_in(guild_id, message_id, stars)
+        elif starrer_id in stars[1]:
+            raise StarboardError('\N{NO ENTRY SIGN} You already starred this message.')
+        else:
+            await self.stars_db.append_in(guild_id, (message_id, 1), starrer_id)
 
         if stars[0] is None:
-            sent = await self.bot.send_message(starboard_channel, content, embed=embed)
-            stars[0] = sent.id
-            await self.stars_db.put(guild_id, db)
+            await self.create_post(guild_id, message_id, starboard_channel, star_message)
             return
 
         bot_msg = await self.get_message(starboard_channel, stars[0])
         if bot_msg is None:
             await self.bot.say('\N{BLACK QUESTION MARK ORNAMENT} Expected to be in {0.mention} but is not.'.format(starboard_channel))
-            db.pop(message_id, None)
-            await self.stars_db.put(guild_id, db)
+            await self.pop_star_entry(guild_id, message_id)
             return
 
-        await self.stars_db.put(guild_id, db)
-        await self.bot.edit_message(bot_msg, content, embed=embed)
+        self.queue_edit(guild_id, message_id, bot_msg, star_message)
 
     async def unstar_message(self, message, starrer_id, message_id):
         guild_id = message.server.id
@@ -171,16 +349,14 @@ class Starboard:
 
         starrers = stars[1]
         try:
-            starrers.remove(starrer_id)
+            await self.stars_db.remove_in(guild_id, (message_id, 1), starrer_id)
         except ValueError:
             raise StarboardError('\N{NO ENTRY SIGN} You have not starred this message.')
 
-        db[message_id] = stars
         bot_msg = await self.get_message(starboard_channel, stars[0])
         if bot_msg is not None:
             if len(starrers) == 0:
-                db.pop(message_id, None)
-                await self.stars_db.put(guild_id, db)
+                await self.pop_star_entry(guild_id, message_id)
                 await self.bot.delete_message(bot_msg)
             else:
                 if message.id != message_id:
@@ -190,9 +366,7 @@ class Starboard:
                 else:
                     star_message = message
 
-                content, embed = self.emoji_message(star_message, len(starrers))
-                await self.stars_db.put(guild_id, db)
-                await self.bot.edit_message(bot_msg, content, embed=embed)
+                self.queue_edit(guild_id, message_id, bot_msg, star_message)
 
     @commands.command(pass_context=True, no_pm=True)
     @checks.admin_or_permissions(administrator=True)
@@ -236,31 +410,38 @@ class Starboard:
         else:
             stars['channel'] = channel.id
             await self.stars_db.put(server.id, stars)
+            self._post_index.pop(server.id, None)
             await self.bot.say('\N{GLOWING STAR} Starboard created at ' + channel.mention)
 
     async def get_message(self, channel, message_id):
-        try: 
-            return self._message_cache[message_id]
-        except KeyError:
+        message = self._message_cache.get(message_id)
+        if message is None:
             try:
-                message = self._message_cache[message_id] = await self.bot.get_message(channel, message_id)
+                message = await self.bot.get_message(channel, message_id)
             except discord.HTTPException:
                 return None
-            else:
-                return message
+            self._message_cache.put(message_id, message)
+        return message
 
     async def on_command_error(self, error, ctx):
         if isinstance(error, StarboardError):
             await self.bot.send_message(ctx.message.channel, error)
 
-    async def on_socket_raw_receive(self, data):
-        if isinstance(data, bytes):
+    async def on_socket_response(self, data):
+        # The frame has already been parsed once by the library and is
+        # shared between every cog listening to it.
+        event = data.get('t')
+        if event not in STARBOARD_EVENTS:
             return
 
-        data = json.loads(data)
-        event = data.get('t')
         payload = data.get('d')
 
+        if event in ('MESSAGE_UPDATE', 'MESSAGE_DELETE'):
+            self._message_cache.invalidate(payload['id'])
+        elif event == 'MESSAGE_DELETE_BULK':
+            for message_id in payload['ids']:
+                self._message_cache.invalidate(message_id)
+
         if event not in ('MESSAGE_DELETE', 'MESSAGE_REACTION_ADD', 'MESSAGE_REACTION_REMOVE'):
             return
 
@@ -300,10 +481,9 @@ class Starboard:
 
         # see if the message being deleted is in the starboard
         msg_id = payload['id']
-        exists = discord.utils.find(lambda k: isinstance(db[k], list) and db[k][0] == msg_id, db)
+        exists = self.original_message_id(server.id, msg_id)
         if exists:
-            db.pop(exists)
-            await self.stars_db.put(server.id, db)
+            await self.pop_star_entry(server.id, exists)
 
     @commands.group(pass_context=True, no_pm=True, invoke_without_command=True)
     async def star(self, ctx, message: int):
@@ -355,24 +535,15 @@ class Starboard:
         Admin role.
         """
 
-        def cleanup_task():
-            task = self.janitor_tasks.pop(ctx.guild_id)
-            task.cancel()
-            ctx.db.pop('janitor', None)
-
         if minutes <= 0.0:
-            cleanup_task()
+            self.janitor.cancel(ctx.guild_id)
+            await self.stars_db.pop_in(ctx.guild_id, 'janitor', None)
             await self.bot.say('\N{SQUARED OK} No more cleaning up.')
         else:
-            if 'janitor' in ctx.db:
-                cleanup_task()
-
-            ctx.db['janitor'] = minutes * 60.0
-            self.janitor_tasks[ctx.guild_id] = self.bot.loop.create_task(self.janitor(ctx.guild_id))
+            await self.stars_db.set_in(ctx.guild_id, 'janitor', minutes * 60.0)
+            self.janitor.schedule(ctx.guild_id, minutes * 60.0)
             await self.bot.say('Remember to \N{PUT LITTER IN ITS PLACE SYMBOL}')
 
-        await self.stars_db.put(ctx.guild_id, ctx.db)
-
     @star.command(name='clean', pass_context=True, no_pm=True)
     @checks.admin_or_permissions(manage_messages=True)
     @requires_starboard()
@@ -387,8 +558,21 @@ class Starboard:
         """
 
         stars = 1 if stars < 0 else stars
-        await self.clean_starboard(ctx, stars)
-        await self.bot.say('\N{PUT LITTER IN ITS PLACE SYMBOL}')
+        removed = await self.clean_starboard(ctx.guild_id, ctx.starboard_channel, stars)
+        await self.bot.say('\N{PUT LITTER IN ITS PLACE SYMBOL} Removed {} messages.'.format(removed))
+
+    @star.command(name='stats', hidden=True)
+    @checks.is_owner()
+    async def star_stats(self):
+        """Shows starboard cache and edit statistics."""
+        entries = [
+            ('Cached Messages', len(self._message_cache)),
+            ('Cache Hit Rate', '{:.1%}'.format(self._message_cache.hit_rate)),
+            ('Pending Edits', len(self._pending_edits)),
+            ('Coalesced Edits', self.edits_coalesced),
+            ('Janitors', len(self.janitor)),
+        ]
+        await formats.entry_to_code(self.bot, entries)
 
 
 def setup(bot):
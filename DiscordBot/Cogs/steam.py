@@ -1,7 +1,5 @@
 from discord.ext import commands
 
-from .Utils import steamapi, zrpc
-
 
 class Steam:
     """Steam related commands"""
@@ -33,7 +31,7 @@ class Steam:
 
         # Check that the ZRPC server is up
         try:
-            zrpc.hello()
+            await self.bot.node.hello()
         except:
             await self.bot.say("The ZRPC server is currently down. Tell MashThat5A.")
             return
@@ -59,7 +57,7 @@ class Steam:
             return
 
         steamthing = msg.content
-        steamid = steamapi.SteamAPI(self.bot.steam_api_key).determine_steam_id(steamthing)
+        steamid = await self.bot.steam_api.determine_steam_id(steamthing)
 
         if steamid == 76561198296540546:
             await self.bot.whisper('You have linked something to MT5ABot. Goodbye.')
@@ -70,7 +68,7 @@ class Steam:
                                    .format(steamthing))
             return
 
-        if zrpc.add_pending_discord_link(str(steamid), str(author.id)):
+        if await self.bot.node.add_pending_discord_link(str(steamid), str(author.id)):
             await self.bot.whisper(
                 "Your Steam account was determined to be http://steamcommunity.com/profiles/{0}".format(steamid))
             await self.bot.whisper(
@@ -91,7 +89,7 @@ class Steam:
     async def verify(self, ctx):
         # Check that the ZRPC server is up
         try:
-            zrpc.hello()
+            await self.bot.node.hello()
         except:
             await self.bot.say("The ZRPC server is currently down. Tell @MashThat5A#6431")
             return
@@ -107,18 +105,15 @@ class Steam:
             await self.bot.say("Please only input the code given through Steam.")
             return
 
-        reply = zrpc.verify_code(str(author.id), split_msg[2])
+        reply = await self.bot.node.verify_code(str(author.id), split_msg[2])
         if reply:
-            steam_info = self.bot.steam_info.get(author.id)
-            if steam_info is None:
-                linked_steam_ids = [reply]
-                await self.bot.steam_info.put(author.id, linked_steam_ids)
-            else:
-                if reply in steam_info:
-                    await self.bot.say("Steam account {0} has already been linked to {1.mention}.".format(reply, author))
-                    return
-                steam_info.append(reply)
-                await self.bot.steam_info.put(author.id, steam_info)
+            # Checked and appended under the database lock so concurrent
+            # verifications cannot link the same account twice
+            if not await self.bot.steam_info.append_in(author.id, (), reply, unique=True):
+                await self.bot.say("Steam account {0} has already been linked to {1.mention}.".format(reply, author))
+                return
+
+            self.bot.linked_accounts.link(author.id, reply)
 
             await self.bot.say("Steam account {0} is now linked to {1.mention}.".format(reply, author))
 
@@ -9,6 +9,8 @@ import sys
 from collections import Counter
 import os
 
+from Cogs.Utils import database, linked_accounts, noderpc, ratelimit, reference, steamapi
+
 initial_extensions = [
     'Cogs.admin',
     'Cogs.egl',
@@ -31,11 +33,20 @@ log.addHandler(handler)
 help_attrs = dict(hidden=True)
 
 prefix = ['?', '!']
-bot = commands.Bot(command_prefix=prefix, description=description, pm_help=False, help_attrs=help_attrs)
 
 
-#zrpc = zerorpc.Client()
-#zrpc.connect("tcp://127.0.0.1:4242")
+class MT5ABot(commands.Bot):
+    async def logout(self):
+        # Flush write-behind databases and close clients while the event loop
+        # is still running, it is closed by the time bot.run returns.
+        await database.flush_all()
+        await self.node.close()
+        await self.steam_api.close()
+        await super().logout()
+
+
+bot = MT5ABot(command_prefix=prefix, description=description, pm_help=False, help_attrs=help_attrs)
+
 
 @bot.event
 async def on_command_error(error, ctx):
@@ -89,6 +100,22 @@ if __name__ == '__main__':
     bot.owner_id = credentials['owner_id']
     bot.steam_api_key = credentials['steam_api_key']
     bot.dropbox_token = credentials['dropbox_token']
+    steam_cache = steamapi.ResponseCache(path='steam_cache.json')
+    steam_limiter = ratelimit.TokenBucket(credentials.get('steam_api_rate', 5.0), loop=bot.loop)
+    bot.steam_api = steamapi.AsyncSteamAPI(bot.steam_api_key, cache=steam_cache, limiter=steam_limiter, loop=bot.loop)
+
+    # Shared databases
+    database.default_engine = credentials.get('database_engine', database.default_engine)
+    database.engine_overrides.update(credentials.get('database_engines', {}))
+    bot.steam_info = database.connect('steam_info.json', loop=bot.loop)
+    bot.dota_ticker_settings = database.connect('dota_ticker_settings.json', loop=bot.loop)
+    bot.linked_accounts = linked_accounts.LinkedAccountIndex(bot)
+
+    # Dota 2 reference data shared by the cogs
+    bot.dota_data = reference.DotaData()
+
+    # RPC client for the Node Steam/Dota service
+    bot.node = noderpc.Client(credentials.get('node_address', noderpc.ADDRESS), loop=bot.loop)
 
     for extension in initial_extensions:
         try:
@@ -97,6 +124,7 @@ if __name__ == '__main__':
             print('Failed to load extension {}\n{}: {}'.format(extension, type(e).__name__, e))
 
     bot.run(token)
+    steam_cache.save()
     handlers = log.handlers[:]
     for hdlr in handlers:
         hdlr.close()